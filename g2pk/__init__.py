@@ -1 +1,6 @@
-from g2pk import G2p
\ No newline at end of file
+from g2pk.g2pk import G2p
+from g2pk.stream import StreamingG2p
+from g2pk.incremental import IncrementalG2p
+from g2pk.phonemes import PAD, SYMBOLS, UNK
+# convert_parallel (g2pk.parallel) and AsyncG2p (g2pk.aio) are imported from their modules,
+# so that importing g2pk does not import multiprocessing and asyncio.
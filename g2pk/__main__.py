@@ -0,0 +1,3 @@
+from g2pk.cli import main
+
+main()
@@ -0,0 +1,152 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from g2pk.g2pk import G2p
+from g2pk.parallel import start_pool, _convert
+
+
+def _resolve(future, result=None, error=None):
+    # the caller may have given up on it meanwhile
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class AsyncG2p(object):
+    '''Converts text from asyncio code without blocking the event loop.
+
+    Requests that arrive within `max_delay` seconds of the first one waiting are converted together,
+    as one G2p.batch of up to `max_batch` texts. At most `workers` batches run at a time:
+    with one worker on a thread with `g2p`, with more on as many processes, each with its own G2p.
+    Once `max_pending` requests are waiting, convert() waits for room before queueing its text,
+    so that callers slow down instead of the queue growing without bound.
+    '''
+    def __init__(self, g2p=None, workers=1, max_batch=64, max_delay=0.002, max_pending=1024, idioms=None):
+        if workers > 1 and g2p is not None:
+            raise ValueError("worker processes build their own G2p; pass idioms instead of g2p")
+        self.g2p = g2p
+        self.idioms = idioms
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.executor = None
+        self.pool = None
+        self.queue = None
+        self.collector = None
+        self.slots = None
+
+    def start(self):
+        '''Starts the worker(s) and the batching task. convert() calls it on first use.'''
+        if self.collector is not None:
+            return
+        if self.workers > 1:
+            self.pool = start_pool(self.workers, self.idioms)
+        else:
+            if self.g2p is None:
+                self.g2p = G2p(idioms=self.idioms)
+            self.executor = ThreadPoolExecutor(1)
+        self.queue = asyncio.Queue(self.max_pending)
+        self.slots = asyncio.Semaphore(self.workers)
+        self.collector = asyncio.ensure_future(self._collect())
+
+    async def convert(self, text, descriptive=False, group_vowels=False, to_syl=True):
+        self.start()
+        future = asyncio.get_event_loop().create_future()
+        await self.queue.put((text, (descriptive, group_vowels, to_syl), future))
+        return await future
+
+    @property
+    def pending(self):
+        '''Number of requests waiting for a batch.'''
+        return self.queue.qsize() if self.queue is not None else 0
+
+    async def _collect(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            batch = [await self.queue.get()]
+            try:
+                deadline = loop.time() + self.max_delay
+                while len(batch) < self.max_batch:
+                    if not self.queue.empty():
+                        batch.append(self.queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self.slots.acquire()
+            except asyncio.CancelledError:
+                # closed while the batch waited for a worker
+                for _, _, future in batch:
+                    future.cancel()
+                raise
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        try:
+            opts2items = dict()
+            for item in batch:
+                opts2items.setdefault(item[1], []).append(item)
+            for opts, items in opts2items.items():
+                texts = [text for text, _, _ in items]
+                try:
+                    outs = await self._submit(texts, opts)
+                except Exception as e:
+                    for _, _, future in items:
+                        _resolve(future, error=e)
+                else:
+                    for (_, _, future), out in zip(items, outs):
+                        _resolve(future, out)
+        finally:
+            self.slots.release()
+
+    def _submit(self, texts, opts):
+        loop = asyncio.get_event_loop()
+        if self.pool is None:
+            descriptive, group_vowels, to_syl = opts
+            return loop.run_in_executor(self.executor, lambda: self.g2p.batch(
+                texts, descriptive=descriptive, group_vowels=group_vowels, to_syl=to_syl))
+
+        future = loop.create_future()
+        self.pool.apply_async(_convert, (texts,) + opts,
+                              callback=lambda outs: loop.call_soon_threadsafe(_resolve, future, outs),
+                              error_callback=lambda e: loop.call_soon_threadsafe(_resolve, future, None, e))
+        return future
+
+    async def close(self):
+        '''Stops batching and shuts the workers down. Requests still queued are cancelled.'''
+        if self.collector is None:
+            return
+        self.collector.cancel()
+        try:
+            await self.collector
+        except asyncio.CancelledError:
+            pass
+        # each request taken off a full queue lets a caller waiting for room queue its own
+        while not self.queue.empty():
+            while not self.queue.empty():
+                self.queue.get_nowait()[2].cancel()
+            await asyncio.sleep(0)
+        # wait for the batches in flight
+        for _ in range(self.workers):
+            await self.slots.acquire()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        self.collector = None
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
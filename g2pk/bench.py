@@ -0,0 +1,336 @@
+'''Benchmarks G2p as a whole and stage by stage.
+
+    python -m g2pk.bench [--repeat N] [--corpus FILE] [--descriptive] [--rules] [--threads 1,2,4] [--document] [--annotate] [--cold] [--backends] [--skips]
+
+Reports sentences per second, p50/p99 latency and peak memory
+for G2p.__call__ and for each of its stages.
+With --rules, reports how often each rule fires and what it costs instead, from traced runs.
+With --threads, converts the corpus with G2p.map on each number of threads, one shared G2p,
+and reports the throughput and any result that differs from converting one sentence at a time.
+With --document, times G2p.document on documents of 100 characters to 1 MB made from the corpus,
+next to G2p.__call__ on the whole document up to --whole-limit characters.
+With --annotate, times MeCab and the alignment of its tokens in annotate apart, on documents of the same sizes
+with a blank between every two characters.
+With --cold, times importing g2pk, G2p() and the first conversion in fresh processes,
+once with the rule bundle on disk and once with an empty cache directory, where it is built first.
+With --backends, times the rules after preprocessing, which is what the backends of G2p.batch differ in,
+with backend="python" and backend="numpy" on batches of 16 to 4096 sentences, and counts differing results.
+With --skips, reports how many sentences of the corpus skip each stage of preprocessing, MeCab included,
+and how fast G2p.__call__ is on those that skip MeCab and on the others.
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from g2pk.g2pk import BATCH_SEP, G2p, _get_examples, convert_eng, align, annotate, convert_num, group, compose, decompose
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench.txt")
+
+
+def load_corpus(path=CORPUS_PATH):
+    '''Returns the sentences in `path` followed by the examples in rules.txt.'''
+    sents = []
+    for line in open(path, 'r', encoding='utf8'):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            sents.append(line)
+    sents += [inp for inp, _ in _get_examples()]
+    return list(dict.fromkeys(sents))
+
+
+def get_stages(g2p, descriptive=False, group_vowels=False, to_syl=True):
+    '''Returns (name, function) for each stage of G2p.__call__, in order.'''
+    stages = [("idioms", g2p.idioms),
+              ("convert_eng", lambda string: convert_eng(string, g2p.cmu, g2p.eng_cache)),
+              ("annotate", lambda string: annotate(string, g2p.mecab)),
+              ("convert_num", convert_num),
+              ("decompose", decompose),
+              ("rules", lambda inp: g2p.rules(inp, descriptive)),
+              ("table", g2p.compiled_table),
+              ("links", lambda inp: g2p.links(inp, descriptive))]
+    if group_vowels:
+        stages.append(("group", group))
+    if to_syl:
+        stages.append(("compose", compose))
+    return stages
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(g2p, sents, repeat=3, **opts):
+    '''Returns {name: (seconds per sentence, peak bytes)} for "total" and each stage.'''
+    stages = get_stages(g2p, **opts)
+    times = {name: [] for name in ["total"] + [name for name, _ in stages]}
+
+    for _ in range(repeat):
+        for sent in sents:
+            start = time.perf_counter()
+            expected = g2p(sent, **opts)
+            times["total"].append(time.perf_counter() - start)
+
+            out = sent
+            for name, stage in stages:
+                start = time.perf_counter()
+                out = stage(out)
+                times[name].append(time.perf_counter() - start)
+            if out != expected:
+                raise RuntimeError(f"bench stages are out of sync with G2p.__call__ on {sent!r}")
+
+    peaks = {name: 0 for name in times}
+    tracemalloc.start()
+    for sent in sents:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        g2p(sent, **opts)
+        peaks["total"] = max(peaks["total"], tracemalloc.get_traced_memory()[1] - base)
+
+        out = sent
+        for name, stage in stages:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            out = stage(out)
+            peaks[name] = max(peaks[name], tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+
+    return {name: (times[name], peaks[name]) for name in times}
+
+
+def report(results):
+    total = sum(results["total"][0])
+    print(f"{'stage':<16}{'sent/s':>12}{'p50 us':>10}{'p99 us':>10}{'share':>8}{'peak KB':>10}")
+    for name, (times, peak) in results.items():
+        elapsed = sum(times)
+        print(f"{name:<16}{len(times) / max(elapsed, 1e-12):>12.0f}{percentile(times, .5) * 1e6:>10.1f}"
+              f"{percentile(times, .99) * 1e6:>10.1f}{elapsed / total:>8.1%}{peak / 1024:>10.1f}")
+
+
+def profile_rules(g2p, sents, repeat=1, **opts):
+    '''Returns {(stage, rule): [applications, changes, seconds]} from traced runs of g2p.'''
+    stats = defaultdict(lambda: [0, 0, 0.])
+
+    def record(event):
+        stat = stats[event.stage, event.rule]
+        stat[0] += 1
+        stat[1] += event.span is not None
+        stat[2] += event.seconds
+
+    for _ in range(repeat):
+        for sent in sents:
+            g2p(sent, trace=record, **opts)
+    return dict(stats)
+
+
+def report_rules(stats, top=40):
+    print(f"{'stage':<14}{'rule':<14}{'applied':>9}{'fired':>9}{'us/call':>10}{'total ms':>10}")
+    for (stage, rule), (applied, fired, seconds) in sorted(stats.items(), key=lambda item: -item[1][2])[:top]:
+        if isinstance(rule, tuple):
+            rule = "/".join(rule)
+        print(f"{stage:<14}{rule or '-':<14}{applied:>9}{fired:>9}{seconds / applied * 1e6:>10.1f}{seconds * 1e3:>10.1f}")
+
+
+def stress(g2p, sents, threads, repeat=3, **opts):
+    '''Returns {threads: (sentences per second, mismatches)} of G2p.map for each number of threads.'''
+    expected = [g2p(sent, **opts) for sent in sents] * repeat
+    sents = sents * repeat
+    results = dict()
+    for n in threads:
+        start = time.perf_counter()
+        outs = g2p.map(sents, threads=n, chunksize=16, **opts)
+        elapsed = time.perf_counter() - start
+        results[n] = (len(sents) / elapsed, sum(out != exp for out, exp in zip(outs, expected)))
+    return results
+
+
+def make_document(sents, size):
+    '''Joins the sentences, five to a line, over and over until the text is `size` characters long.'''
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        part = sents[i % len(sents)] + ("\n" if i % 5 == 4 else " ")
+        parts.append(part)
+        length += len(part)
+        i += 1
+    return "".join(parts)[:size]
+
+
+def scaling(g2p, sents, sizes, whole_limit=10000, **opts):
+    '''Returns {size: (seconds of G2p.document, seconds of G2p.__call__ or None)} for each document size.'''
+    results = dict()
+    for size in sizes:
+        doc = make_document(sents, size)
+        start = time.perf_counter()
+        g2p.document(doc, **opts)
+        elapsed = time.perf_counter() - start
+        whole = None
+        if size <= whole_limit:
+            start = time.perf_counter()
+            g2p(doc, **opts)
+            whole = time.perf_counter() - start
+        results[size] = (elapsed, whole)
+    return results
+
+
+def time_align(g2p, sents, sizes):
+    '''Returns {size: (seconds of MeCab, seconds of align)} for documents with a blank between every two characters.
+
+    MeCab tags the documents line by line, as it takes more than linear time on long lines.
+    '''
+    sents = [" ".join(sent.replace(" ", "")) for sent in sents]
+    results = dict()
+    for size in sizes:
+        doc = make_document(sents, size)
+        start = time.perf_counter()
+        tokens = [token for line in doc.split("\n") for token in g2p.mecab.pos(line)]
+        tagging = time.perf_counter() - start
+        start = time.perf_counter()
+        align(doc, tokens)
+        results[size] = (tagging, time.perf_counter() - start)
+    return results
+
+
+COLD_START = """import time
+start = time.perf_counter()
+import g2pk
+from g2pk import G2p
+imported = time.perf_counter()
+g2p = G2p()
+built = time.perf_counter()
+g2p("어제는 날씨가 맑았는데, 오늘은 흐리다.")
+print(imported - start, built - imported, time.perf_counter() - built)
+"""
+
+
+def cold_start(runs=9, empty_cache=False):
+    '''Returns the median seconds of (import, G2p(), first conversion) in `runs` fresh processes,
+    each with an empty G2PK_CACHE_DIR of its own if `empty_cache` is True.'''
+    times = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env = dict(os.environ)
+            if empty_cache:
+                env["G2PK_CACHE_DIR"] = cache_dir
+            out = subprocess.run([sys.executable, "-c", COLD_START], env=env, check=True, stdout=subprocess.PIPE)
+        times.append([float(t) for t in out.stdout.split()])
+    return tuple(statistics.median(run[i] for run in times) for i in range(3))
+
+
+def compare_backends(g2p, sents, sizes, repeat=3, **opts):
+    '''Returns {batch size: (sentences per second with the python backend, with the numpy one, mismatches)}
+    of the rules applied to the preprocessed sentences.'''
+    strings = [g2p.preprocess(sent) for sent in sents] * repeat
+    g2p.vectorized(strings[:1], **opts)
+    results = dict()
+    for size in sizes:
+        chunks = [strings[i:i + size] for i in range(0, len(strings), size)]
+        start = time.perf_counter()
+        python = [out for chunk in chunks
+                  for out in g2p.apply_rules(decompose(BATCH_SEP.join(chunk)), **opts).split(BATCH_SEP)]
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        numpy = [out for chunk in chunks for out in g2p.vectorized(chunk, **opts)]
+        vectorized = time.perf_counter() - start
+        results[size] = (len(strings) / elapsed, len(strings) / vectorized, sum(a != b for a, b in zip(python, numpy)))
+    return results
+
+
+def skip_rates(g2p, sents, repeat=3, **opts):
+    '''Returns ({stage: share of `sents` that skip it}, (seconds per sentence that skips MeCab or None,
+    seconds per sentence that runs it or None)).'''
+    before = g2p.skip_info()
+    skips_mecab = []
+    for sent in sents:
+        annotated = before["annotate"]
+        g2p(sent, **opts)
+        before = g2p.skip_info()
+        skips_mecab.append(before["annotate"] > annotated)
+    after = g2p.skip_info()
+    times = []
+    for skipped in (True, False):
+        group = [sent for sent, skips in zip(sents, skips_mecab) if skips == skipped]
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for sent in group:
+                g2p(sent, **opts)
+        times.append((time.perf_counter() - start) / (len(group) * repeat) if group else None)
+    return {stage: count / len(sents) for stage, count in after.items() if stage != "strings"}, tuple(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m g2pk.bench", description="Benchmarks G2p stage by stage.")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="one sentence per line. rules.txt examples are added")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the corpus")
+    parser.add_argument("--descriptive", action="store_true")
+    parser.add_argument("--group-vowels", action="store_true")
+    parser.add_argument("--no-syl", action="store_true")
+    parser.add_argument("--rules", action="store_true", help="profile the stages and rules one application at a time")
+    parser.add_argument("--threads", help="comma-separated numbers of threads to run G2p.map with, e.g. 1,2,4")
+    parser.add_argument("--document", action="store_true", help="time G2p.document from 100 characters to 1 MB")
+    parser.add_argument("--annotate", action="store_true", help="time MeCab and align from 100 characters to 1 MB")
+    parser.add_argument("--cold", action="store_true", help="time import, G2p() and the first call in new processes")
+    parser.add_argument("--backends", action="store_true", help="time the rules with the python and numpy backends")
+    parser.add_argument("--skips", action="store_true", help="report how often each stage of preprocessing is skipped")
+    parser.add_argument("--whole-limit", type=int, default=10000,
+                        help="with --document, longest document also converted in one G2p call")
+    args = parser.parse_args(argv)
+
+    sents = load_corpus(args.corpus)
+    start = time.perf_counter()
+    g2p = G2p()
+    g2p("warm up with English: g2p")
+    print(f"{len(sents)} sentences x {args.repeat}, G2p() and warm-up took {time.perf_counter() - start:.2f}s")
+
+    opts = dict(descriptive=args.descriptive, group_vowels=args.group_vowels, to_syl=not args.no_syl)
+    if args.threads:
+        results = stress(g2p, sents, [int(n) for n in args.threads.split(",")], args.repeat, **opts)
+        print(f"{'threads':>8}{'sent/s':>10}{'speedup':>9}{'mismatches':>12}")
+        base = next(iter(results.values()))[0]
+        for n, (rate, bad) in results.items():
+            print(f"{n:>8}{rate:>10.0f}{rate / base:>9.2f}{bad:>12}")
+    elif args.document:
+        sizes = [10 ** n for n in range(2, 7)]
+        # the sentences converted first would otherwise pay for filling the caches
+        g2p.document(make_document(sents, 10000), **opts)
+        print(f"{'chars':>9}{'document s':>12}{'us/char':>9}{'whole s':>10}{'us/char':>9}")
+        for size, (elapsed, whole) in scaling(g2p, sents, sizes, args.whole_limit, **opts).items():
+            line = f"{size:>9}{elapsed:>12.3f}{elapsed / size * 1e6:>9.1f}"
+            if whole is not None:
+                line += f"{whole:>10.3f}{whole / size * 1e6:>9.1f}"
+            print(line)
+    elif args.annotate:
+        print(f"{'chars':>9}{'MeCab s':>10}{'us/char':>9}{'align s':>10}{'us/char':>9}")
+        for size, (tagging, aligning) in time_align(g2p, sents, [10 ** n for n in range(2, 7)]).items():
+            print(f"{size:>9}{tagging:>10.3f}{tagging / size * 1e6:>9.2f}{aligning:>10.3f}{aligning / size * 1e6:>9.2f}")
+    elif args.cold:
+        print(f"{'':<14}{'import ms':>10}{'G2p() ms':>10}{'first ms':>10}")
+        for name, empty_cache in (("bundle", False), ("no bundle", True)):
+            times = cold_start(args.repeat * 3, empty_cache)
+            print(f"{name:<14}" + "".join(f"{t * 1e3:>10.1f}" for t in times))
+    elif args.backends:
+        print(f"{'batch':>6}{'python sent/s':>15}{'numpy sent/s':>14}{'speedup':>9}{'mismatches':>12}")
+        results = compare_backends(g2p, sents, [16, 64, 256, 1024, 4096], args.repeat, **opts)
+        for size, (python, numpy, bad) in results.items():
+            print(f"{size:>6}{python:>15.0f}{numpy:>14.0f}{numpy / python:>9.2f}{bad:>12}")
+    elif args.skips:
+        shares, (skipping, running) = skip_rates(g2p, sents, args.repeat, **opts)
+        for stage, share in shares.items():
+            print(f"{stage:<12}skipped by {share:>6.1%} of the sentences")
+        for name, seconds in (("skip MeCab", skipping), ("run MeCab", running)):
+            if seconds is not None:
+                print(f"{name:<12}{seconds * 1e6:>8.1f} us per sentence")
+    elif args.rules:
+        report_rules(profile_rules(g2p, sents, args.repeat, **opts))
+    else:
+        report(run(g2p, sents, args.repeat, **opts))
+
+
+if __name__ == "__main__":
+    main()
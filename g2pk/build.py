@@ -0,0 +1,30 @@
+'''Builds the on-disk stores of g2pk ahead of time, e.g. in a docker image.
+
+    python -m g2pk.build [--transliterate] [--words FILE]
+'''
+import argparse
+import os
+from g2pk.cmu import STORE_PATH, build_store
+from g2pk.g2pk import build_eng_store, build_rule_bundle, RULE_BUNDLE_PATH
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m g2pk.build", description="Builds the on-disk stores of g2pk.")
+    parser.add_argument("--transliterate", action="store_true",
+                        help="transliterate the whole CMU vocabulary for convert_eng")
+    parser.add_argument("--words", help="a file of extra English words to transliterate, one per line")
+    args = parser.parse_args(argv)
+
+    build_rule_bundle()
+    print(RULE_BUNDLE_PATH)
+    # rewriting the CMU store would invalidate the store of transliterations built from it
+    print(STORE_PATH if os.path.exists(STORE_PATH) else build_store())
+    if args.transliterate or args.words:
+        words = None
+        if args.words:
+            words = [line.strip() for line in open(args.words, 'r', encoding='utf8') if line.strip()]
+        print(build_eng_store(words=words, vocab=args.transliterate))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import hashlib
+import json
+import os
+
+# Bumped whenever the layout of the bundles changes, so that old ones are rebuilt.
+BUNDLE_VERSION = 1
+
+
+def stamps(sources):
+    '''Returns [path, size, mtime in ns] of each source file, which a bundle built from them records.'''
+    out = []
+    for path in sources:
+        st = os.stat(path)
+        out.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    return out
+
+
+def make_header(body, sources, version=BUNDLE_VERSION):
+    '''Returns the header of `body`, bytes built from the files `sources`: its version, their stamps and its sha256.'''
+    return {"version": version, "sources": stamps(sources), "sha256": hashlib.sha256(body).hexdigest()}
+
+
+def check_header(header, body, sources, version=BUNDLE_VERSION):
+    '''Whether `header` is that of `body` at `version`, built from `sources` as they are now.'''
+    try:
+        return header == make_header(body, sources, version)
+    except OSError:
+        return False
+
+
+def write_bundle(path, sources, payload):
+    '''Writes `payload`, anything json can hold, to `path` as built from the files `sources`.
+
+    The first line is a header with the version, the stamps of the sources and the sha256 of the second,
+    the payload as json.
+    '''
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf8")
+    header = make_header(body, sources)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(json.dumps(header).encode("utf8") + b"\n" + body)
+    os.replace(tmp, path)
+    return path
+
+
+def read_bundle(path, sources):
+    '''Returns the payload of the bundle at `path`, or None if it is missing, corrupt,
+    of another version or was not built from `sources` as they are now.'''
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        head, body = data.split(b"\n", 1)
+        if not check_header(json.loads(head.decode("utf8")), body, sources):
+            return None
+        return json.loads(body.decode("utf8"))
+    except (OSError, ValueError):
+        return None
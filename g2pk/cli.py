@@ -0,0 +1,96 @@
+import argparse
+import sys
+import time
+from itertools import tee
+from g2pk.g2pk import G2p
+from g2pk.parallel import convert_parallel, chunked
+
+
+def column_number(value):
+    column = int(value)
+    if column < 1:
+        raise argparse.ArgumentTypeError(f"columns are numbered from 1, not {value}")
+    return column
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="g2pk", description="Converts Korean text to its pronunciation, line by line.")
+    parser.add_argument("files", nargs="*", default=["-"], help="input files. reads stdin if omitted or '-'")
+    parser.add_argument("-o", "--output", default="-", help="output file. writes to stdout by default")
+    parser.add_argument("-c", "--column", type=column_number, default=None,
+                        help="convert only this 1-based column of tab-separated lines, e.g. 2 for 'id\\ttext'")
+    parser.add_argument("--descriptive", action="store_true", help="descriptive instead of prescriptive pronunciation")
+    parser.add_argument("--group-vowels", action="store_true", help="normalize vowels that are hard to distinguish")
+    parser.add_argument("--no-syl", action="store_true", help="output jamo instead of syllables")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="number of worker processes")
+    parser.add_argument("--chunksize", type=int, default=256, help="lines converted together")
+    parser.add_argument("--progress", action="store_true", help="report throughput in lines per second to stderr")
+    return parser.parse_args(argv)
+
+
+def read_lines(files):
+    for name in files:
+        if name == "-":
+            for line in sys.stdin:
+                yield line.rstrip("\r\n")
+        else:
+            with open(name, 'r', encoding='utf8') as f:
+                for line in f:
+                    yield line.rstrip("\r\n")
+
+
+def select(rows, column):
+    for row in rows:
+        if column is None:
+            yield row
+        else:
+            fields = row.split("\t")
+            yield fields[column - 1] if len(fields) >= column else ""
+
+
+def merge(row, converted, column):
+    if column is None:
+        return converted
+    fields = row.split("\t")
+    if len(fields) < column:
+        return row
+    fields[column - 1] = converted
+    return "\t".join(fields)
+
+
+def convert(texts, workers=1, chunksize=256, **opts):
+    if workers > 1:
+        yield from convert_parallel(texts, workers=workers, chunksize=chunksize, **opts)
+    else:
+        g2p = G2p()
+        for chunk in chunked(texts, chunksize):
+            yield from g2p.batch(chunk, **opts)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    opts = dict(descriptive=args.descriptive, group_vowels=args.group_vowels, to_syl=not args.no_syl)
+
+    rows, _rows = tee(read_lines(args.files))
+    converted = convert(select(_rows, args.column), args.workers, args.chunksize, **opts)
+    out = sys.stdout if args.output == "-" else open(args.output, 'w', encoding='utf8')
+
+    start = last = time.time()
+    n = 0
+    try:
+        for row, pron in zip(rows, converted):
+            out.write(merge(row, pron, args.column) + "\n")
+            n += 1
+            if args.progress and time.time() - last >= 1:
+                last = time.time()
+                print(f"\r{n} lines, {n / (last - start):.1f} lines/s", end="", file=sys.stderr, flush=True)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    if args.progress:
+        elapsed = time.time() - start
+        print(f"\r{n} lines in {elapsed:.1f}s, {n / max(elapsed, 1e-9):.1f} lines/s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import json
+import mmap
+import os
+import threading
+from g2pk.bundle import check_header, make_header
+
+CACHE_DIR = os.environ.get("G2PK_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "g2pk"))
+STORE_PATH = os.path.join(CACHE_DIR, "cmudict.tsv")
+# transliterations of English words, see g2pk.g2pk.EngCache
+ENG_STORE_PATH = os.path.join(CACHE_DIR, "eng.tsv")
+
+
+def load_nltk_cmudict():
+    import nltk
+    from nltk.corpus import cmudict
+
+    try:
+        nltk.data.find('corpora/cmudict.zip')
+    except LookupError:
+        nltk.download('cmudict')
+    return cmudict.dict()
+
+
+def write_store(path, items, version=None, sources=()):
+    '''Writes (key, value) pairs to `path`, one `key\\tvalue` per line, sorted by key.
+
+    With a `version`, they follow a header line like that of g2pk.bundle, for CheckedStore.
+    '''
+    body = "".join(f"{key}\t{value}\n" for key, value in sorted(items)).encode('utf8')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        if version is not None:
+            f.write(json.dumps(make_header(body, sources, version)).encode('utf8') + b"\n")
+        f.write(body)
+    os.replace(tmp, path)
+    return path
+
+
+def build_store(path=STORE_PATH, cmu=None):
+    '''Writes the first pronunciation of every word in the CMU dictionary to `path`.'''
+    if cmu is None:
+        cmu = load_nltk_cmudict()
+    return write_store(path, ((word, " ".join(prons[0])) for word, prons in cmu.items()))
+
+
+class SortedStore(object):
+    '''Read-only lookups in a file written by write_store.
+
+    The file is memory-mapped and binary searched, so nothing is read up front
+    and all processes using the same file share its pages through the page cache.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.mm = None
+        self.items = None  # in-memory fallback, see CmuDict
+        self.start = 0  # where the entries start, after any header
+        self.lock = threading.Lock()
+
+    def load(self):
+        if self.mm is None and self.items is None:
+            with self.lock:
+                if self.mm is None and self.items is None:
+                    self._open()
+        return self
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def get(self, key):
+        '''Returns the value of `key`, or None if it is not in the store.'''
+        self.load()
+        if self.items is not None:
+            return self.items.get(key)
+
+        mm = self.mm
+        key = key.encode('utf8')
+        lo, hi = self.start, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            tab = mm.find(b"\t", start, end)
+            entry = mm[start:tab]
+            if entry == key:
+                return mm[tab + 1:end].decode('utf8')
+            elif entry < key:
+                lo = end + 1
+            else:
+                hi = start
+        return None
+
+    def __iter__(self):
+        self.load()
+        if self.items is not None:
+            yield from self.items.items()
+            return
+        mm = self.mm
+        start = self.start
+        while start < len(mm):
+            end = mm.find(b"\n", start)
+            key, value = mm[start:end].decode('utf8').split("\t")
+            yield key, value
+            start = end + 1
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
+class CheckedStore(SortedStore):
+    '''A SortedStore written by write_store with a header. It reads as empty unless the header is that of
+    `version`, built from `sources` as they are now, and the sha256 in it matches the entries.'''
+    def __init__(self, path, version, sources=()):
+        super().__init__(path)
+        self.version = version
+        self.sources = sources
+
+    def _open(self):
+        try:
+            super()._open()
+            end = self.mm.find(b"\n")
+            if check_header(json.loads(self.mm[:end].decode('utf8')), self.mm[end + 1:], self.sources, self.version):
+                self.start = end + 1
+                return
+        except (OSError, ValueError):
+            pass
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.items = dict()
+
+
+class CmuDict(SortedStore):
+    '''The first CMU pronunciation of each word, as used by convert_eng.
+
+    Nothing is loaded until the first lookup. The store at `path` is built from NLTK's cmudict
+    the first time it is missing.
+    `cmu[word]` returns a one-element list of arpabets, like `cmudict.dict()[word][:1]`.
+    '''
+    def __init__(self, path=STORE_PATH):
+        super().__init__(path)
+
+    def _open(self):
+        if not os.path.exists(self.path):
+            cmu = load_nltk_cmudict()
+            try:
+                build_store(self.path, cmu)
+            except OSError:
+                self.items = {word: " ".join(prons[0]) for word, prons in cmu.items()}
+                return
+        super()._open()
+
+    def __getitem__(self, word):
+        pron = self.get(word)
+        if pron is None:
+            raise KeyError(word)
+        return [pron.split()]
@@ -1,14 +1,17 @@
+import hashlib
 import os
 import re
-import nltk
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import mecab
-from jamo import h2j, j2h
-from nltk.corpus import cmudict
-
-try:
-    nltk.data.find('corpora/cmudict.zip')
-except LookupError:
-    nltk.download('cmudict')
+from g2pk.cache import LRUCache
+from g2pk.hangul import FINALS, compose, decompose
+from g2pk.bundle import read_bundle, stamps, write_bundle
+from g2pk.phonemes import pad_ids, to_ids
+from g2pk.cmu import CACHE_DIR, CheckedStore, CmuDict, SortedStore, ENG_STORE_PATH, write_store
 
 BOUND_NOUNS = "군데 권 개 그루 닢 대 두 마리 모 모금 뭇 발 발짝 방 번 벌 보루 살 수 술 시 쌈 움큼 정 짝 채 척 첩 축 켤레 톨 통"
 eng2kor = {
@@ -195,54 +198,203 @@ def parse_table():
     return table
 
 
-def annotate(string, mecab):
-    tokens = mecab.pos(string)
-    if string.replace(" ", "") != "".join(token for token, _ in tokens):
+@lru_cache(maxsize=None)
+def shared_table():
+    '''Returns table.csv parsed and compiled, once per process. G2p instances share it and never modify it.'''
+    records = load_rule_bundle()["table"]
+    table = tuple((str1, str2, tuple(rule_ids)) for str1, str2, rule_ids, _ in records)
+    return table, CompiledTable(table, triggers=[trigger for _, _, _, trigger in records])
+
+
+@lru_cache(maxsize=None)
+def shared_cmu():
+    '''Returns the CmuDict used by G2p instances that are not given one.'''
+    return CmuDict()
+
+
+# Runs of codas, possibly separated by single blanks, plus everything a table rule
+# can consume after the last coda: an optional blank and an onset, a non-word character, or the end.
+CODA_CLUSTER = re.compile("[\u11A8-\u11C2]+(?: [\u11A8-\u11C2]+)*(?: [\u1100-\u1112]|[\u1100-\u1112]|\\W|$)")
+
+
+class CompiledTable(object):
+    '''Applies the rules of table.csv in a single scan.
+
+    Every table rule starts with a coda and reaches at most one onset further,
+    so two rules can only interact inside one coda cluster.
+    Each distinct cluster is rewritten once by running the rules in table order
+    and the result is memoized, which keeps the output identical to
+    applying the rules one by one over the whole string.
+    A rule is skipped when its trigger, a literal that every match contains, does not occur,
+    and its pattern is compiled the first time it is not.
+    '''
+    def __init__(self, table, cache_size=65536, triggers=None):
+        self.table = [(str1, str2, rule_ids) for str1, str2, rule_ids in table]
+        if triggers is None:
+            triggers = [literal_trigger(str1) for str1, _, _ in self.table]
+        self.triggers = triggers
+        self.patterns = [None] * len(self.table)
+        self.cache = dict()
+        self.cache_size = cache_size
+
+    def pattern(self, i):
+        pattern = self.patterns[i]
+        if pattern is None:
+            pattern = self.patterns[i] = re.compile(self.table[i][0])
+        return pattern
+
+    @property
+    def rules(self):
+        '''(compiled pattern, replacement, rule ids) of every rule, in table order.'''
+        return [(self.pattern(i), str2, rule_ids) for i, (_, str2, rule_ids) in enumerate(self.table)]
+
+    def rewrite(self, cluster):
+        out = self.cache.get(cluster)
+        if out is None:
+            out = cluster
+            for i, trigger in enumerate(self.triggers):
+                if trigger in out:
+                    out = self.pattern(i).sub(self.table[i][1], out)
+            if len(self.cache) < self.cache_size:
+                self.cache[cluster] = out
+        return out
+
+    def __call__(self, inp):
+        return CODA_CLUSTER.sub(lambda m: self.rewrite(m.group()), inp)
+
+
+def parse_idioms(idioms_path):
+    idioms = []
+    for line in open(idioms_path, 'r', encoding="utf8"):
+        line = line.split("#")[0].strip()
+        if "===" in line:
+            str1, str2 = line.split("===")
+            idioms.append((str1, str2))
+    return idioms
+
+
+def idiom_sources(idioms):
+    '''Returns [str1, str2, whether it needs re] for each idiom, and the pattern that triggers them, or None.'''
+    records = []
+    groups = False
+    for str1, str2 in idioms:
+        regex = any(c in "\\.^$*+?{}[]|()" for c in str1) or "\\" in str2
+        groups = groups or regex and re.compile(str1).groups > 0
+        records.append([str1, str2, regex])
+    if len(records) == 0:
+        return records, None
+    if groups:
+        # group numbers would be shifted in the joined pattern
+        return records, ""
+    return records, "|".join(f"(?:{str1})" for str1, _, _ in records)
+
+
+class CompiledIdioms(object):
+    '''Applies idiom substitutions in order, earlier ones first.
+
+    `idioms` is a path to a file in the format of idioms.txt,
+    a dict of {str1: str2} or a list of (str1, str2) pairs.
+    All patterns are joined into one trigger so that strings without any idiom
+    are returned after a single search. Idioms without regex syntax are replaced
+    as plain strings. idioms.txt itself is read from the rule bundle.
+    '''
+    def __init__(self, idioms):
+        if isinstance(idioms, str) and os.path.abspath(idioms) == RULE_SOURCES[2]:
+            records, trigger = load_rule_bundle()["idioms"]
+        else:
+            if isinstance(idioms, str):
+                idioms = parse_idioms(idioms)
+            elif isinstance(idioms, dict):
+                idioms = list(idioms.items())
+            records, trigger = idiom_sources(idioms)
+        self.rules = [(str1, re.compile(str1) if regex else None, str2) for str1, str2, regex in records]
+        self.trigger = re.compile(trigger) if trigger is not None else None
+
+    def fires(self, string):
+        '''Whether any idiom can apply to `string`.'''
+        return self.trigger is not None and self.trigger.search(string) is not None
+
+    def __call__(self, string):
+        return self.apply(string) if self.fires(string) else string
+
+    def apply(self, string):
+        for str1, regex, str2 in self.rules:
+            if regex is None:
+                string = string.replace(str1, str2)
+            else:
+                string = regex.sub(str2, string)
         return string
-    blanks = [i for i, char in enumerate(string) if char == " "]
 
-    tag_seq = []
+
+# How far ahead align looks for a token that MeCab did not return verbatim.
+RESYNC = 16
+# Tails that verb stems tagged with /P end in
+STEM_FINALS = frozenset("ᆫᆬᆷᆱᆰᆲᆴ")
+
+
+def tag_suffix(char, tag):
+    tag = tag.split("+")[-1]
+    if tag == "NNBC":
+        return "/B"
+    tag = tag[0]
+    if tag == "J":
+        return "/J" if char == "의" else ""
+    if tag == "E":
+        return "/E" if FINALS.get(char, char) == "ᆯ" else ""
+    if tag == "V":
+        return "/P" if FINALS.get(char, char) in STEM_FINALS else ""
+    return ""
+
+
+def align(string, tokens):
+    '''Tags the last character of certain morphemes among MeCab's `tokens` for `string`: 의 as a josa with /J,
+    ㄹ endings with /E, verb stems ending in ㄴ, ㅁ and their clusters with /P and counting bound nouns with /B.
+
+    Each token is looked up where the previous one ended, past any blanks. A token that is not
+    found there nor within RESYNC characters is left untagged, and the rest are still aligned.
+    '''
+    out = []
+    start = pos = 0
     for token, tag in tokens:
-        tag = tag.split("+")[-1]
-        if tag == "NNBC":
-            tag = "B"
-        else:
-            tag = tag[0]
-        tag_seq.append("_" * (len(token) - 1) + tag)
-    tag_seq = "".join(tag_seq)
-
-    for i in blanks:
-        tag_seq = tag_seq[:i] + " " + tag_seq[i:]
-
-    annotated = ""
-    for char, tag in zip(string, tag_seq):
-        annotated += char
-        if char == "의" and tag == "J":
-            annotated += "/J"
-        elif tag == "E":
-            if h2j(char)[-1] in "ᆯ":
-                annotated += "/E"
-        elif tag == "V":
-            if h2j(char)[-1] in "ᆫᆬᆷᆱᆰᆲᆴ":
-                annotated += "/P"
-        elif tag == "B":
-            annotated += "/B"
-
-    return annotated
-
-
-def compose(letters):
-    letters = re.sub("(^|[^\u1100-\u1112])([\u1161-\u1175])", r"\1ᄋ\2", letters)
-    string = letters
-    syls = set(re.findall("[\u1100-\u1112][\u1161-\u1175][\u11A8-\u11C2]", string))
-    for syl in syls:
-        string = string.replace(syl, j2h(*syl))
-
-    syls = set(re.findall("[\u1100-\u1112][\u1161-\u1175]", string))
-    for syl in syls:
-        string = string.replace(syl, j2h(*syl))
+        if not string.startswith(token, pos):
+            while pos < len(string) and string[pos].isspace():
+                pos += 1
+            if not string.startswith(token, pos):
+                found = string.find(token, pos, pos + len(token) + RESYNC)
+                if found < 0:
+                    continue
+                pos = found
+        pos += len(token)
+        suffix = tag_suffix(string[pos - 1], tag)
+        if suffix:
+            out.append(string[start:pos])
+            out.append(suffix)
+            start = pos
+    out.append(string[start:])
+    return "".join(out)
 
-    return string
+
+def annotate(string, mecab):
+    return align(string, mecab.pos(string))
+
+
+def syllables(finals="", leads=""):
+    '''Returns a character class of the Hangul syllables with one of the tails `finals`, or one of the leads `leads`.'''
+    chars = [syl for syl, final in FINALS.items() if final and final in finals]
+    for lead in leads:
+        first = 0xAC00 + (ord(lead) - 0x1100) * 588
+        chars.append(f"{chr(first)}-{chr(first + 587)}")
+    return "[" + "".join(chars) + "]"
+
+
+# Where a tag of annotate can change the output; strings without any skip MeCab. These are 의 (/J), stems before
+# ᄀ, ᄃ, ᄉ or ᄌ (/P), ㄹ before a blank and ᄀ, ᄃ, ᄇ, ᄉ or ᄌ (/E) and numbers (/B for convert_num). Any tag,
+# /B included, also stops YUK and the rules that read across syllables, all of which start at these tails.
+TAG_SITES = re.compile("의|\\d|[십백]육|[\u1100-\u11FF]"
+                       f"|{syllables('ᆰᆲᆴ')}"
+                       f"|{syllables('ᆫᆬᆷᆱ')}{syllables(leads='ᄀᄃᄉᄌ')}"
+                       f"|{syllables('ᆮᆽᆾᇀᇂᆿᇁ')}{syllables(leads='ᄋᄒ')}"
+                       f"|{syllables('ᆯ')}{syllables(leads='ᄀᄇᄉᄌ')}|{syllables('ᆯ')} {syllables(leads='ᄀᄃᄇᄉᄌ')}")
 
 
 def group(inp):
@@ -255,7 +407,7 @@ def group(inp):
 
 
 def _get_examples():
-    text = open('rules.txt', 'r', encoding='utf8').read().splitlines()
+    text = open(os.path.dirname(os.path.abspath(__file__)) + '/rules.txt', 'r', encoding='utf8').read().splitlines()
     examples = []
     for line in text:
         if line.startswith("->"):
@@ -278,7 +430,29 @@ def get_rule_id2text():
     return rule_id2text
 
 
-rule_id2text = get_rule_id2text()
+# One stage or rule applied to a string. `span` is (start, end in before, end in after)
+# of the part that changed, or None if nothing did.
+TraceEvent = namedtuple("TraceEvent", ["stage", "rule", "before", "after", "span", "seconds"])
+
+
+def changed_span(before, after):
+    if before == after:
+        return None
+    n = min(len(before), len(after))
+    start = 0
+    while start < n and before[start] == after[start]:
+        start += 1
+    end = 0
+    while end < n - start and before[-1 - end] == after[-1 - end]:
+        end += 1
+    return start, len(before) - end, len(after) - end
+
+
+def traced(trace, stage, rule, func, inp):
+    start = time.perf_counter()
+    out = func(inp)
+    trace(TraceEvent(stage, rule, inp, out, changed_span(inp, out), time.perf_counter() - start))
+    return out
 
 
 def gloss(verbose, out, inp, rule):
@@ -287,258 +461,332 @@ def gloss(verbose, out, inp, rule):
         print("\033[1;31m", rule, "\033[0m")
 
 
-def link1(inp, verbose=False):
-    rule = rule_id2text["13"]
-    out = inp
-
-    pairs = [("ᆨᄋ", "ᄀ"),
-             ("ᆩᄋ", "ᄁ"),
-             ("ᆫᄋ", "ᄂ"),
-             ("ᆮᄋ", "ᄃ"),
-             ("ᆯᄋ", "ᄅ"),
-             ("ᆷᄋ", "ᄆ"),
-             ("ᆸᄋ", "ᄇ"),
-             ("ᆺᄋ", "ᄉ"),
-             ("ᆻᄋ", "ᄊ"),
-             ("ᆽᄋ", "ᄌ"),
-             ("ᆾᄋ", "ᄎ"),
-             ("ᆿᄋ", "ᄏ"),
-             ("ᇀᄋ", "ᄐ"),
-             ("ᇁᄋ", "ᄑ")]
-    for str1, str2 in pairs:
-        out = out.replace(str1, str2)
+def literal_trigger(pattern):
+    '''Returns the longest literal that every match of pattern contains, or "" if none is found.'''
+    runs = [""]
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 1
+            runs.append("")
+        elif c == "[":
+            i = pattern.index("]", i + 2)
+            runs.append("")
+        elif c in "?*+{":
+            if depth == 0 and runs[-1]:
+                runs[-1] = runs[-1][:-1]
+            if c == "{":
+                i = pattern.index("}", i)
+            runs.append("")
+        elif c == "|" and depth == 0:
+            return ""
+        elif c == "(":
+            depth += 1
+            runs.append("")
+        elif c == ")":
+            depth -= 1
+            runs.append("")
+        elif c in ".^$|" or depth > 0:
+            runs.append("")
+        else:
+            runs[-1] += c
+        i += 1
+    return max(runs, key=len)
+
+
+RULE_SOURCES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+                for name in ("table.csv", "rules.txt", "idioms.txt")]
+# one bundle for each copy of g2pk installed
+RULE_BUNDLE_PATH = os.path.join(CACHE_DIR, "rules-{}.json".format(
+    hashlib.sha1(os.path.dirname(os.path.abspath(__file__)).encode("utf8")).hexdigest()[:12]))
+
+
+# path: (stamps of the sources, payload) of the bundles read
+_rule_bundles = dict()
+
+
+def build_rule_bundle(path=RULE_BUNDLE_PATH):
+    '''Parses the RULE_SOURCES and writes them to the bundle at `path`. Returns what load_rule_bundle does.
+
+    The bundle holds the table rules in order with the trigger of each, the text of each rule in rules.txt
+    and the idioms of idioms.txt as idiom_sources returns them.
+    '''
+    payload = {"table": [[str1, str2, rule_ids, literal_trigger(str1)] for str1, str2, rule_ids in parse_table()],
+               "rule_id2text": get_rule_id2text(),
+               "idioms": list(idiom_sources(parse_idioms(RULE_SOURCES[2])))}
+    try:
+        write_bundle(path, RULE_SOURCES, payload)
+    except OSError:
+        # e.g. a read-only home; it is parsed again next time
+        pass
+    return payload
+
+
+def load_rule_bundle(path=RULE_BUNDLE_PATH):
+    '''Reads the bundle at `path` in one go, or builds it if it is missing or the RULE_SOURCES have changed since.
+
+    It is read once per process, unless the RULE_SOURCES change.
+    '''
+    sources = stamps(RULE_SOURCES)
+    loaded = _rule_bundles.get(path)
+    if loaded is not None and loaded[0] == sources:
+        return loaded[1]
+    payload = read_bundle(path, RULE_SOURCES)
+    if payload is None:
+        payload = build_rule_bundle(path)
+    _rule_bundles[path] = (sources, payload)
+    return payload
+
+
+rule_id2text = load_rule_bundle()["rule_id2text"]
+
+
+class Rule(object):
+    '''A hand-written rule: (pattern, replacement) steps run in order, like a chain of re.sub calls.
+
+    A step may carry a third element, the value of `descriptive` it is restricted to.
+    A step is skipped when its trigger, a literal that every match contains, does not occur.
+    '''
+    def __init__(self, rule_id, steps):
+        self.rule_id = rule_id
+        self.text = rule_id2text.get(rule_id, "")
+        self.steps = []
+        for step in steps:
+            pattern, repl = step[:2]
+            guard = step[2] if len(step) > 2 else None
+            if not any(c in "\\.^$*+?{}[]|()" for c in pattern):
+                self.steps.append((pattern, None, repl, guard))
+            else:
+                self.steps.append((literal_trigger(pattern), re.compile(pattern), repl, guard))
 
-    gloss(verbose, out, inp, rule)
-    return out
+    def compiled(self, descriptive=False):
+        return [(trigger, regex, repl) for trigger, regex, repl, guard in self.steps
+                if guard is None or guard == descriptive]
 
+    def __call__(self, inp, descriptive=False, verbose=False):
+        out = run_steps(self.compiled(descriptive), inp)
+        if verbose:
+            gloss(verbose, out, inp, self.text)
+        return out
 
-def link2(inp, verbose=False):
-    rule = rule_id2text["14"]
-    out = inp
-
-    pairs = [("ᆪᄋ", "ᆨᄊ"),
-             ("ᆬᄋ", "ᆫᄌ"),
-             ("ᆰᄋ", "ᆯᄀ"),
-             ("ᆱᄋ", "ᆯᄆ"),
-             ("ᆲᄋ", "ᆯᄇ"),
-             ("ᆳᄋ", "ᆯᄊ"),
-             ("ᆴᄋ", "ᆯᄐ"),
-             ("ᆵᄋ", "ᆯᄑ"),
-             ("ᆹᄋ", "ᆸᄊ")]
-    for str1, str2 in pairs:
-        out = out.replace(str1, str2)
 
-    gloss(verbose, out, inp, rule)
-    return out
+def run_steps(steps, inp):
+    for trigger, regex, repl in steps:
+        if trigger in inp:
+            inp = inp.replace(trigger, repl) if regex is None else regex.sub(repl, inp)
+    return inp
 
 
-def link3(inp, verbose=False):
-    rule = rule_id2text["15"]
-    out = inp
-
-    pairs = [("ᆨ ᄋ", " ᄀ"),
-             ("ᆩ ᄋ", " ᄁ"),
-             ("ᆫ ᄋ", " ᄂ"),
-             ("ᆮ ᄋ", " ᄃ"),
-             ("ᆯ ᄋ", " ᄅ"),
-             ("ᆷ ᄋ", " ᄆ"),
-             ("ᆸ ᄋ", " ᄇ"),
-             ("ᆺ ᄋ", " ᄉ"),
-             ("ᆻ ᄋ", " ᄊ"),
-             ("ᆽ ᄋ", " ᄌ"),
-             ("ᆾ ᄋ", " ᄎ"),
-             ("ᆿ ᄋ", " ᄏ"),
-             ("ᇀ ᄋ", " ᄐ"),
-             ("ᇁ ᄋ", " ᄑ"),
-             ("ᆪ ᄋ", "ᆨ ᄊ"),
-             ("ᆬ ᄋ", "ᆫ ᄌ"),
-             ("ᆰ ᄋ", "ᆯ ᄀ"),
-             ("ᆱ ᄋ", "ᆯ ᄆ"),
-             ("ᆲ ᄋ", "ᆯ ᄇ"),
-             ("ᆳ ᄋ", "ᆯ ᄊ"),
-             ("ᆴ ᄋ", "ᆯ ᄐ"),
-             ("ᆵ ᄋ", "ᆯ ᄑ"),
-             ("ᆹ ᄋ", "ᆸ ᄊ")]
+class CompiledRules(object):
+    '''Runs a sequence of Rules as one flat list of steps, compiled once per value of `descriptive`.
+
+    The order of the steps is that of calling the rules one after another,
+    so the output is the same, but only verbose runs pay for a call and a gloss per rule.
+    '''
+    def __init__(self, rules):
+        self.rules = rules
+        self.steps = {descriptive: [step for rule in rules for step in rule.compiled(descriptive)]
+                      for descriptive in (False, True)}
+
+    def __call__(self, inp, descriptive=False, verbose=False):
+        if verbose:
+            for rule in self.rules:
+                inp = rule(inp, descriptive, verbose)
+            return inp
+        return run_steps(self.steps[descriptive], inp)
+
+
+LINK1 = Rule("13", [("ᆨᄋ", "ᄀ"),
+                    ("ᆩᄋ", "ᄁ"),
+                    ("ᆫᄋ", "ᄂ"),
+                    ("ᆮᄋ", "ᄃ"),
+                    ("ᆯᄋ", "ᄅ"),
+                    ("ᆷᄋ", "ᄆ"),
+                    ("ᆸᄋ", "ᄇ"),
+                    ("ᆺᄋ", "ᄉ"),
+                    ("ᆻᄋ", "ᄊ"),
+                    ("ᆽᄋ", "ᄌ"),
+                    ("ᆾᄋ", "ᄎ"),
+                    ("ᆿᄋ", "ᄏ"),
+                    ("ᇀᄋ", "ᄐ"),
+                    ("ᇁᄋ", "ᄑ")])
+
+LINK2 = Rule("14", [("ᆪᄋ", "ᆨᄊ"),
+                    ("ᆬᄋ", "ᆫᄌ"),
+                    ("ᆰᄋ", "ᆯᄀ"),
+                    ("ᆱᄋ", "ᆯᄆ"),
+                    ("ᆲᄋ", "ᆯᄇ"),
+                    ("ᆳᄋ", "ᆯᄊ"),
+                    ("ᆴᄋ", "ᆯᄐ"),
+                    ("ᆵᄋ", "ᆯᄑ"),
+                    ("ᆹᄋ", "ᆸᄊ")])
+
+LINK3 = Rule("15", [(str1 + h, str2 + h)
+                    for str1, str2 in [("ᆨ ᄋ", " ᄀ"),
+                                       ("ᆩ ᄋ", " ᄁ"),
+                                       ("ᆫ ᄋ", " ᄂ"),
+                                       ("ᆮ ᄋ", " ᄃ"),
+                                       ("ᆯ ᄋ", " ᄅ"),
+                                       ("ᆷ ᄋ", " ᄆ"),
+                                       ("ᆸ ᄋ", " ᄇ"),
+                                       ("ᆺ ᄋ", " ᄉ"),
+                                       ("ᆻ ᄋ", " ᄊ"),
+                                       ("ᆽ ᄋ", " ᄌ"),
+                                       ("ᆾ ᄋ", " ᄎ"),
+                                       ("ᆿ ᄋ", " ᄏ"),
+                                       ("ᇀ ᄋ", " ᄐ"),
+                                       ("ᇁ ᄋ", " ᄑ"),
+                                       ("ᆪ ᄋ", "ᆨ ᄊ"),
+                                       ("ᆬ ᄋ", "ᆫ ᄌ"),
+                                       ("ᆰ ᄋ", "ᆯ ᄀ"),
+                                       ("ᆱ ᄋ", "ᆯ ᄆ"),
+                                       ("ᆲ ᄋ", "ᆯ ᄇ"),
+                                       ("ᆳ ᄋ", "ᆯ ᄊ"),
+                                       ("ᆴ ᄋ", "ᆯ ᄐ"),
+                                       ("ᆵ ᄋ", "ᆯ ᄑ"),
+                                       ("ᆹ ᄋ", "ᆸ ᄊ")]
+                    for h in ['ㅏ', 'ㅓ', 'ㅗ', 'ㅜ', 'ㅟ']])
+
+LINK4 = Rule("12.4", [("ᇂᄋ", "ᄋ"),
+                      ("ᆭᄋ", "ᄂ"),
+                      ("ᆶᄋ", "ᄅ")])
+
+JYEO = Rule("5.1", [("([ᄌᄍᄎ])ᅧ", r"\1ᅥ")])
+
+YE = Rule("5.2", [("([ᄀᄁᄃᄄㄹᄆᄇᄈᄌᄍᄎᄏᄐᄑᄒ])ᅨ", r"\1ᅦ", True)])
+
+CONSONANT_UI = Rule("5.3", [("([ᄀᄁᄂᄃᄄᄅᄆᄇᄈᄉᄊᄌᄍᄎᄏᄐᄑᄒ])ᅴ", r"\1ᅵ")])
+
+JOSA_UI = Rule("5.4.2", [("의/J", "에", True),
+                         ("/J", "", False)])
+
+VOWEL_UI = Rule("5.4.1", [(r"(\Sᄋ)ᅴ", r"\1ᅵ", True)])
+
+JAMO = Rule("16", [("([그])ᆮᄋ", r"\1ᄉ"),
+                   ("([으])[ᆽᆾᇀᇂ]ᄋ", r"\1ᄉ"),
+                   ("([으])[ᆿ]ᄋ", r"\1ᄀ"),
+                   ("([으])[ᇁ]ᄋ", r"\1ᄇ")])
+
+RIEULGIYEOK = Rule("11.1", [("ᆰ/P([ᄀᄁ])", r"ᆯᄁ")])
+
+RIEULBIEUB = Rule("25", [("([ᆲᆴ])/Pᄀ", r"\1ᄁ"),
+                         ("([ᆲᆴ])/Pᄃ", r"\1ᄄ"),
+                         ("([ᆲᆴ])/Pᄉ", r"\1ᄊ"),
+                         ("([ᆲᆴ])/Pᄌ", r"\1ᄍ")])
+
+VERB_NIEUN = Rule("24", [("([ᆫᆷ])/Pᄀ", r"\1ᄁ"),
+                         ("([ᆫᆷ])/Pᄃ", r"\1ᄄ"),
+                         ("([ᆫᆷ])/Pᄉ", r"\1ᄊ"),
+                         ("([ᆫᆷ])/Pᄌ", r"\1ᄍ"),
+
+                         ("ᆬ/Pᄀ", "ᆫᄁ"),
+                         ("ᆬ/Pᄃ", "ᆫᄄ"),
+                         ("ᆬ/Pᄉ", "ᆫᄊ"),
+                         ("ᆬ/Pᄌ", "ᆫᄍ"),
+
+                         ("ᆱ/Pᄀ", "ᆷᄁ"),
+                         ("ᆱ/Pᄃ", "ᆷᄄ"),
+                         ("ᆱ/Pᄉ", "ᆷᄊ"),
+                         ("ᆱ/Pᄌ", "ᆷᄍ")])
+
+# exceptions; the last group matches the syllable final or consonants
+BALB = Rule("10.1", [("(바)ᆲ(($|[^ᄋᄒ]))", r"\1ᆸ\2"),
+                     ("(너)ᆲ([ᄌᄍ]ᅮ|[ᄃᄄ]ᅮ)", r"\1ᆸ\2")])
+
+PALATALIZE = Rule("17", [("ᆮᄋ([ᅵᅧ])", r"ᄌ\1"),
+                         ("ᇀᄋ([ᅵᅧ])", r"ᄎ\1"),
+                         ("ᆴᄋ([ᅵᅧ])", r"ᆯᄎ\1"),
+
+                         ("ᆮᄒ([ᅵ])", r"ᄎ\1")])
+
+MODIFYING_RIEUL = Rule("27", [("ᆯ/E ᄀ", r"ᆯ ᄁ"),
+                              ("ᆯ/E ᄃ", r"ᆯ ᄄ"),
+                              ("ᆯ/E ᄇ", r"ᆯ ᄈ"),
+                              ("ᆯ/E ᄉ", r"ᆯ ᄊ"),
+                              ("ᆯ/E ᄌ", r"ᆯ ᄍ"),
+
+                              ("ᆯ걸", "ᆯ껄"),
+                              ("ᆯ밖에", "ᆯ빠께"),
+                              ("ᆯ세라", "ᆯ쎄라"),
+                              ("ᆯ수록", "ᆯ쑤록"),
+                              ("ᆯ지라도", "ᆯ찌라도"),
+                              ("ᆯ지언정", "ᆯ찌언정"),
+                              ("ᆯ진대", "ᆯ찐대")])
+
+REMOVE_TAGS = Rule(None, [("/[PJEB]", "")])
+
+# rules before and after table.csv, in the order G2p.apply_rules runs them
+RULES = [JYEO, YE, CONSONANT_UI, JOSA_UI, VOWEL_UI, JAMO, RIEULGIYEOK, RIEULBIEUB, VERB_NIEUN, BALB, PALATALIZE,
+         MODIFYING_RIEUL, REMOVE_TAGS]
+LINKS = [LINK1, LINK2, LINK4]  # LINK3 is not applied
+COMPILED_RULES = CompiledRules(RULES)
+COMPILED_LINKS = CompiledRules(LINKS)
 
-    for str1, str2 in pairs:
-        for h in ['ㅏ', 'ㅓ', 'ㅗ', 'ㅜ', 'ㅟ']:
-            out = out.replace(str1 + h, str2 + h)
 
-    gloss(verbose, out, inp, rule)
-    return out
+def link1(inp, verbose=False):
+    return LINK1(inp, verbose=verbose)
 
 
-def link4(inp, verbose=False):
-    rule = rule_id2text["12.4"]
+def link2(inp, verbose=False):
+    return LINK2(inp, verbose=verbose)
 
-    out = inp
 
-    pairs = [("ᇂᄋ", "ᄋ"),
-             ("ᆭᄋ", "ᄂ"),
-             ("ᆶᄋ", "ᄅ")]
+def link3(inp, verbose=False):
+    return LINK3(inp, verbose=verbose)
 
-    for str1, str2 in pairs:
-        out = out.replace(str1, str2)
 
-    gloss(verbose, out, inp, rule)
-    return out
+def link4(inp, verbose=False):
+    return LINK4(inp, verbose=verbose)
 
 
 def jyeo(inp, verbose=False):
-    rule = rule_id2text["5.1"]
-    out = re.sub("([ᄌᄍᄎ])ᅧ", r"\1ᅥ", inp)
-    gloss(verbose, out, inp, rule)
-    return out
+    return JYEO(inp, verbose=verbose)
 
 
 def ye(inp, descriptive=False, verbose=False):
-    rule = rule_id2text["5.2"]
-    if descriptive:
-        out = re.sub("([ᄀᄁᄃᄄㄹᄆᄇᄈᄌᄍᄎᄏᄐᄑᄒ])ᅨ", r"\1ᅦ", inp)
-    else:
-        out = inp
-    gloss(verbose, out, inp, rule)
-    return out
+    return YE(inp, descriptive, verbose)
 
 
 def consonant_ui(inp, verbose=False):
-    rule = rule_id2text["5.3"]
-    out = re.sub("([ᄀᄁᄂᄃᄄᄅᄆᄇᄈᄉᄊᄌᄍᄎᄏᄐᄑᄒ])ᅴ", r"\1ᅵ", inp)
-    gloss(verbose, out, inp, rule)
-    return out
+    return CONSONANT_UI(inp, verbose=verbose)
 
 
 def josa_ui(inp, descriptive=False, verbose=False):
-    rule = rule_id2text["5.4.2"]
-    if descriptive:
-        out = re.sub("의/J", "에", inp)
-    else:
-        out = inp.replace("/J", "")
-    gloss(verbose, out, inp, rule)
-    return out
+    return JOSA_UI(inp, descriptive, verbose)
 
 
 def vowel_ui(inp, descriptive=False, verbose=False):
-    rule = rule_id2text["5.4.1"]
-    if descriptive:
-        out = re.sub("(\Sᄋ)ᅴ", r"\1ᅵ", inp)
-    else:
-        out = inp
-    gloss(verbose, out, inp, rule)
-    return out
+    return VOWEL_UI(inp, descriptive, verbose)
 
 
 def jamo(inp, verbose=False):
-    rule = rule_id2text["16"]
-    out = inp
-
-    out = re.sub("([그])ᆮᄋ", r"\1ᄉ", out)
-    out = re.sub("([으])[ᆽᆾᇀᇂ]ᄋ", r"\1ᄉ", out)
-    out = re.sub("([으])[ᆿ]ᄋ", r"\1ᄀ", out)
-    out = re.sub("([으])[ᇁ]ᄋ", r"\1ᄇ", out)
-
-    gloss(verbose, out, inp, rule)
-    return out
+    return JAMO(inp, verbose=verbose)
 
 
 def rieulgiyeok(inp, verbose=False):
-    rule = rule_id2text["11.1"]
-
-    out = inp
-    out = re.sub("ᆰ/P([ᄀᄁ])", r"ᆯᄁ", out)
-
-    gloss(verbose, out, inp, rule)
-    return out
+    return RIEULGIYEOK(inp, verbose=verbose)
 
 
 def rieulbieub(inp, verbose=False):
-    rule = rule_id2text["25"]
-    out = inp
-
-    out = re.sub("([ᆲᆴ])/Pᄀ", r"\1ᄁ", out)
-    out = re.sub("([ᆲᆴ])/Pᄃ", r"\1ᄄ", out)
-    out = re.sub("([ᆲᆴ])/Pᄉ", r"\1ᄊ", out)
-    out = re.sub("([ᆲᆴ])/Pᄌ", r"\1ᄍ", out)
-
-    gloss(verbose, out, inp, rule)
-    return out
+    return RIEULBIEUB(inp, verbose=verbose)
 
 
 def verb_nieun(inp, verbose=False):
-    rule = rule_id2text["24"]
-    out = inp
-
-    pairs = [("([ᆫᆷ])/Pᄀ", r"\1ᄁ"),
-             ("([ᆫᆷ])/Pᄃ", r"\1ᄄ"),
-             ("([ᆫᆷ])/Pᄉ", r"\1ᄊ"),
-             ("([ᆫᆷ])/Pᄌ", r"\1ᄍ"),
-
-             ("ᆬ/Pᄀ", "ᆫᄁ"),
-             ("ᆬ/Pᄃ", "ᆫᄄ"),
-             ("ᆬ/Pᄉ", "ᆫᄊ"),
-             ("ᆬ/Pᄌ", "ᆫᄍ"),
-
-             ("ᆱ/Pᄀ", "ᆷᄁ"),
-             ("ᆱ/Pᄃ", "ᆷᄄ"),
-             ("ᆱ/Pᄉ", "ᆷᄊ"),
-             ("ᆱ/Pᄌ", "ᆷᄍ")]
-
-    for str1, str2 in pairs:
-        out = re.sub(str1, str2, out)
-
-    gloss(verbose, out, inp, rule)
-    return out
+    return VERB_NIEUN(inp, verbose=verbose)
 
 
 def balb(inp, verbose=False):
-    rule = rule_id2text["10.1"]
-    out = inp
-    syllable_final_or_consonants = "($|[^ᄋᄒ])"
-
-    # exceptions
-    out = re.sub(f"(바)ᆲ({syllable_final_or_consonants})", r"\1ᆸ\2", out)
-    out = re.sub(f"(너)ᆲ([ᄌᄍ]ᅮ|[ᄃᄄ]ᅮ)", r"\1ᆸ\2", out)
-    gloss(verbose, out, inp, rule)
-    return out
+    return BALB(inp, verbose=verbose)
 
 
 def palatalize(inp, verbose=False):
-    rule = rule_id2text["17"]
-    out = inp
-
-    out = re.sub("ᆮᄋ([ᅵᅧ])", r"ᄌ\1", out)
-    out = re.sub("ᇀᄋ([ᅵᅧ])", r"ᄎ\1", out)
-    out = re.sub("ᆴᄋ([ᅵᅧ])", r"ᆯᄎ\1", out)
-
-    out = re.sub("ᆮᄒ([ᅵ])", r"ᄎ\1", out)
-
-    gloss(verbose, out, inp, rule)
-    return out
+    return PALATALIZE(inp, verbose=verbose)
 
 
 def modifying_rieul(inp, verbose=False):
-    rule = rule_id2text["27"]
-    out = inp
-
-    pairs = [("ᆯ/E ᄀ", r"ᆯ ᄁ"),
-             ("ᆯ/E ᄃ", r"ᆯ ᄄ"),
-             ("ᆯ/E ᄇ", r"ᆯ ᄈ"),
-             ("ᆯ/E ᄉ", r"ᆯ ᄊ"),
-             ("ᆯ/E ᄌ", r"ᆯ ᄍ"),
-
-             ("ᆯ걸", "ᆯ껄"),
-             ("ᆯ밖에", "ᆯ빠께"),
-             ("ᆯ세라", "ᆯ쎄라"),
-             ("ᆯ수록", "ᆯ쑤록"),
-             ("ᆯ지라도", "ᆯ찌라도"),
-             ("ᆯ지언정", "ᆯ찌언정"),
-             ("ᆯ진대", "ᆯ찐대")]
-
-    for str1, str2 in pairs:
-        out = re.sub(str1, str2, out)
-
-    gloss(verbose, out, inp, rule)
-    return out
+    return MODIFYING_RIEUL(inp, verbose=verbose)
 
 
 def word_to_hangul(word):
@@ -548,268 +796,602 @@ def word_to_hangul(word):
     return ret
 
 
-def convert_eng(string, cmu):
-    words_set = set(re.findall(r"[a-z][a-z']*[a-z]|[a-z]", string, flags=re.I))
-    eng_words = sorted(words_set, key=len, reverse=True)
-    for eng_word in eng_words:
-        if eng_word.isupper() or (eng_word.lower() not in cmu):
-            ret = word_to_hangul(eng_word.upper())
-            string = string.replace(eng_word, ret)
-            continue
-        word = eng_word.lower()
-        arpabets = cmu[word][0]
-        phonemes = adjust(arpabets)
-        ret = ""
-        for i in range(len(phonemes)):
-            p = phonemes[i]
-            p_prev = phonemes[i - 1] if i > 0 else "^"
-            p_next = phonemes[i + 1] if i < len(phonemes) - 1 else "$"
-            p_next2 = phonemes[i + 1] if i < len(phonemes) - 2 else "$"
-            short_vowels = ("AE", "AH", "AX", "EH", "IH", "IX", "UH")
-            vowels = "AEIOUY"
-            consonants = "BCDFGHJKLMNPQRSTVWXZ"
-            syllable_final_or_consonants = "$BCDFGHJKLMNPQRSTVWXZ"
-            if p in "PTK":
-                if p_prev[:2] in short_vowels and p_next == "$":  # 1
-                    ret += to_jongseong(p)
-                elif p_prev[:2] in short_vowels and p_next[0] not in "AEIOULRMN":  # 2
-                    ret += to_jongseong(p)
-                elif p_next[0] in "$BCDFGHJKLMNPQRSTVWXYZ":  # 3
-                    ret += to_choseong(p)
-                    ret += "ᅳ"
-                else:
-                    ret += to_choseong(p)
-            elif p in "BDG":
+def transliterate(eng_word, cmu):
+    if eng_word.isupper() or (eng_word.lower() not in cmu):
+        return word_to_hangul(eng_word.upper())
+    word = eng_word.lower()
+    arpabets = cmu[word][0]
+    phonemes = adjust(arpabets)
+    ret = ""
+    for i in range(len(phonemes)):
+        p = phonemes[i]
+        p_prev = phonemes[i - 1] if i > 0 else "^"
+        p_next = phonemes[i + 1] if i < len(phonemes) - 1 else "$"
+        p_next2 = phonemes[i + 1] if i < len(phonemes) - 2 else "$"
+        short_vowels = ("AE", "AH", "AX", "EH", "IH", "IX", "UH")
+        vowels = "AEIOUY"
+        consonants = "BCDFGHJKLMNPQRSTVWXZ"
+        syllable_final_or_consonants = "$BCDFGHJKLMNPQRSTVWXZ"
+        if p in "PTK":
+            if p_prev[:2] in short_vowels and p_next == "$":  # 1
+                ret += to_jongseong(p)
+            elif p_prev[:2] in short_vowels and p_next[0] not in "AEIOULRMN":  # 2
+                ret += to_jongseong(p)
+            elif p_next[0] in "$BCDFGHJKLMNPQRSTVWXYZ":  # 3
+                ret += to_choseong(p)
+                ret += "ᅳ"
+            else:
                 ret += to_choseong(p)
+        elif p in "BDG":
+            ret += to_choseong(p)
+            if p_next[0] in syllable_final_or_consonants:
+                ret += "ᅳ"
+        elif p in ("S", "Z", "F", "V", "TH", "DH", "SH", "ZH"):
+            ret += to_choseong(p)
+            if p in ("S", "Z", "F", "V", "TH", "DH"):  # 1
                 if p_next[0] in syllable_final_or_consonants:
                     ret += "ᅳ"
-            elif p in ("S", "Z", "F", "V", "TH", "DH", "SH", "ZH"):
-                ret += to_choseong(p)
-                if p in ("S", "Z", "F", "V", "TH", "DH"):  # 1
-                    if p_next[0] in syllable_final_or_consonants:
-                        ret += "ᅳ"
-                elif p == "SH":  # 2
-                    if p_next[0] in "$":
-                        ret += "ᅵ"
-                    elif p_next[0] in consonants:
-                        ret += "ᅲ"
-                    else:
-                        ret += "Y"
-                elif p == "ZH":  # 3
-                    if p_next[0] in syllable_final_or_consonants:
-                        ret += "ᅵ"
-            elif p in ("TS", "DZ", "CH", "JH",):
-                ret += to_choseong(p)  # 2
-
-                if p_next[0] in syllable_final_or_consonants:  # 1
-                    if p in ("TS", "DZ"):
-                        ret += "ᅳ"
-                    else:
-                        ret += "ᅵ"
-            elif p in ("M", "N", "NG"):
-                if p in "MN" and p_next[0] in vowels:
-                    ret += to_choseong(p)
+            elif p == "SH":  # 2
+                if p_next[0] in "$":
+                    ret += "ᅵ"
+                elif p_next[0] in consonants:
+                    ret += "ᅲ"
                 else:
-                    ret += to_jongseong(p)
-            elif p == "L":
-                if p_prev == "^":
-                    ret += to_choseong(p)
-                elif p_next[0] in "$BCDFGHJKLPQRSTVWXZ":
-                    ret += to_jongseong(p)
-                elif p_prev in "MN":
-                    ret += to_choseong(p)
-                elif p_next[0] in vowels:
-                    ret += "ᆯᄅ"
-                elif p_next in "MN" and p_next2[0] not in vowels:
-                    ret += "ᆯ르"
-            elif p == "ER":
-                if p_prev[0] in vowels:
-                    ret += "ᄋ"
-                ret += to_jungseong(p)
-                if p_next[0] in vowels:
-                    ret += "ᄅ"
-            elif p == "R":
-                if p_next[0] in vowels:
-                    ret += to_choseong(p)
-            elif p[0] in "AEIOU":
-                ret += to_jungseong(p)
+                    ret += "Y"
+            elif p == "ZH":  # 3
+                if p_next[0] in syllable_final_or_consonants:
+                    ret += "ᅵ"
+        elif p in ("TS", "DZ", "CH", "JH",):
+            ret += to_choseong(p)  # 2
 
+            if p_next[0] in syllable_final_or_consonants:  # 1
+                if p in ("TS", "DZ"):
+                    ret += "ᅳ"
+                else:
+                    ret += "ᅵ"
+        elif p in ("M", "N", "NG"):
+            if p in "MN" and p_next[0] in vowels:
+                ret += to_choseong(p)
             else:
+                ret += to_jongseong(p)
+        elif p == "L":
+            if p_prev == "^":
+                ret += to_choseong(p)
+            elif p_next[0] in "$BCDFGHJKLPQRSTVWXZ":
+                ret += to_jongseong(p)
+            elif p_prev in "MN":
+                ret += to_choseong(p)
+            elif p_next[0] in vowels:
+                ret += "ᆯᄅ"
+            elif p_next in "MN" and p_next2[0] not in vowels:
+                ret += "ᆯ르"
+        elif p == "ER":
+            if p_prev[0] in vowels:
+                ret += "ᄋ"
+            ret += to_jungseong(p)
+            if p_next[0] in vowels:
+                ret += "ᄅ"
+        elif p == "R":
+            if p_next[0] in vowels:
                 ret += to_choseong(p)
+        elif p[0] in "AEIOU":
+            ret += to_jungseong(p)
 
-        ret = reconstruct(ret)
-        ret = compose(ret)
-        ret = re.sub("[\u1100-\u11FF]", "", ret)
-        string = string.replace(eng_word, ret)
-    return string
+        else:
+            ret += to_choseong(p)
+
+    ret = reconstruct(ret)
+    ret = compose(ret)
+    ret = re.sub("[\u1100-\u11FF]", "", ret)
+    return ret
+
+
+# Bumped whenever transliterate changes, so that stores of its old output are ignored.
+ENG_STORE_VERSION = 1
+
+
+def eng_store(path, cmu, load=False):
+    '''Returns the store of transliterations at `path`, which reads as empty unless it was written
+    at ENG_STORE_VERSION with `cmu` as it is now. `load` makes sure that the store of `cmu` exists.'''
+    sources = []
+    if isinstance(cmu, SortedStore):
+        sources.append((cmu.load() if load else cmu).path)
+    return CheckedStore(path, ENG_STORE_VERSION, sources)
+
+
+class EngCache(object):
+    '''Word-level cache of transliterate.
+
+    Recent words are kept in an LRU. Misses are looked up in the store at `store_path`, if it exists,
+    before transliterating them. The store is written by build_eng_store or save, and is ignored unless
+    it was written by this version of transliterate with `cmu`.
+    '''
+    def __init__(self, cmu, maxsize=10000, store_path=ENG_STORE_PATH):
+        self.cmu = cmu
+        self.lru = LRUCache(maxsize)
+        self.store_path = store_path
+        self.store = None
+        if store_path is not None and os.path.exists(store_path):
+            self.store = eng_store(store_path, cmu)
+
+    @staticmethod
+    def key(eng_word):
+        # only the all upper case spelling is transliterated differently from the lower case one
+        return eng_word if eng_word.isupper() else eng_word.lower()
+
+    def __call__(self, eng_word):
+        key = self.key(eng_word)
+        ret = self.lru.get(key)
+        if ret is None:
+            if self.store is not None:
+                ret = self.store.get(key)
+            if ret is None:
+                ret = transliterate(eng_word, self.cmu)
+            self.lru.put(key, ret)
+        return ret
+
+    def save(self, path=None):
+        '''Writes the store together with the words in the LRU to `path`, by default the store itself.'''
+        path = self.store_path if path is None else path
+        if path is None:
+            raise ValueError("this cache has no store; pass the path to save it to")
+        items = dict(self.store) if self.store is not None else dict()
+        items.update(self.lru.items())
+        write_store(path, items.items(), ENG_STORE_VERSION, eng_store(path, self.cmu, load=True).sources)
+        self.store = eng_store(path, self.cmu)
+        self.store_path = path
+        return path
+
+
+def build_eng_store(path=ENG_STORE_PATH, words=None, vocab=True, cmu=None):
+    '''Adds the transliterations of `words` and, if `vocab` is True, of the whole CMU vocabulary to the store at `path`.
+    `cmu` is a CmuDict or a mapping like nltk's cmudict.dict().'''
+    cmu = CmuDict() if cmu is None else cmu
+    store = eng_store(path, cmu, load=True)
+    items = dict(store) if os.path.exists(path) else dict()
+    if vocab:
+        # a CmuDict yields (word, pronunciation) pairs itself
+        for word, _ in (cmu if isinstance(cmu, SortedStore) else cmu.items()):
+            items[word] = transliterate(word, cmu)
+    for word in words or []:
+        items[EngCache.key(word)] = transliterate(word, cmu)
+    return write_store(path, items.items(), ENG_STORE_VERSION, store.sources)
+
+
+ENG_WORD = re.compile(r"[a-z][a-z']*[a-z]|[a-z]", flags=re.I)
+
+
+def convert_eng(string, cmu, cache=None):
+    words = dict()
+
+    def convert(m):
+        eng_word = m.group()
+        if eng_word not in words:
+            words[eng_word] = cache(eng_word) if cache is not None else transliterate(eng_word, cmu)
+        return words[eng_word]
+
+    return ENG_WORD.sub(convert, string)
+
+
+SINO_DIGITS = ",일,이,삼,사,오,육,칠,팔,구".split(",")
+NATIVE_ONES = ",한,두,세,네,다섯,여섯,일곱,여덟,아홉".split(",")
+NATIVE_TENS = ",열,스물,서른,마흔,쉰,예순,일흔,여든,아흔".split(",")
+GROUP_UNITS = ("", "만", "억", "조", "경")
+DIGIT2NAME = str.maketrans("0123456789", "영일이삼사오육칠팔구")
+
+
+def place_table(names, place="", drop_one=False):
+    table = {str(d): names[d] + place for d in range(1, 10)}
+    table["0"] = ""
+    if drop_one:
+        table["1"] = place
+    return table
+
+
+def group_tables(drop_one=True, drop_unit_one=False):
+    # place tables for the ones, tens, hundreds and thousands of a 4-digit group
+    return (place_table(SINO_DIGITS, drop_one=drop_unit_one),
+            place_table(SINO_DIGITS, "십", drop_one),
+            place_table(SINO_DIGITS, "백", drop_one),
+            place_table(SINO_DIGITS, "천", drop_one))
+
+
+# 일 is dropped before 십/백/천 below 억 only, and before 만 itself
+SINO_GROUPS = (group_tables(),
+               group_tables(drop_unit_one=True)) + (group_tables(drop_one=False),) * 3
+NATIVE_GROUPS = ((place_table(NATIVE_ONES), place_table(NATIVE_TENS)) + SINO_GROUPS[0][2:],) + SINO_GROUPS[1:]
 
 
 def process_num(num, sino=True):
-    num = re.sub(",", "", num)
+    num = num.replace(",", "")
+    if max(num, default="") > "9":
+        num = "".join(str(int(c)) if c.isdecimal() else c for c in num)
+    if "." in num:
+        num, frac = num.split(".", 1)
+        # an all-zero integer part such as 00 is still read 영
+        return (process_num(num) if num.strip("0") else "영") + "점" + frac.translate(DIGIT2NAME)
     if num == "0":
         return "영"
     if not sino and num == "20":
         return "스무"
-    digits = "123456789"
-    names = "일이삼사오육칠팔구"
-    digit2name = {d: n for d, n in zip(digits, names)}
-    modifiers = "한 두 세 네 다섯 여섯 일곱 여덟 아홉"
-    decimals = "열 스물 서른 마흔 쉰 예순 일흔 여든 아흔"
-    digit2mod = {d: mod for d, mod in zip(digits, modifiers.split())}
-    digit2dec = {d: dec for d, dec in zip(digits, decimals.split())}
-    spelledout = []
-    for i, digit in enumerate(num):
-        i = len(num) - i - 1
-        name = None
-        if sino:
-            if i == 0:
-                name = digit2name.get(digit, "")
-            elif i == 1:
-                name = digit2name.get(digit, "") + "십"
-                name = name.replace("일십", "십")
-        else:
-            if i == 0:
-                name = digit2mod.get(digit, "")
-            elif i == 1:
-                name = digit2dec.get(digit, "")
-        if digit == '0':
-            if i % 4 == 0:
-                last_three = spelledout[-min(3, len(spelledout)):]
-                if "".join(last_three) == "":
-                    spelledout.append("")
-                    continue
-            else:
-                spelledout.append("")
-                continue
-        if i == 2:
-            name = digit2name.get(digit, "") + "백"
-            name = name.replace("일백", "백")
-        elif i == 3:
-            name = digit2name.get(digit, "") + "천"
-            name = name.replace("일천", "천")
-        elif i == 4:
-            name = digit2name.get(digit, "") + "만"
-            name = name.replace("일만", "만")
-        elif i == 5:
-            name = digit2name.get(digit, "") + "십"
-            name = name.replace("일십", "십")
-        elif i == 6:
-            name = digit2name.get(digit, "") + "백"
-            name = name.replace("일백", "백")
-        elif i == 7:
-            name = digit2name.get(digit, "") + "천"
-            name = name.replace("일천", "천")
-        elif i == 8:
-            name = digit2name.get(digit, "") + "억"
-        elif i == 9:
-            name = digit2name.get(digit, "") + "십"
-        elif i == 10:
-            name = digit2name.get(digit, "") + "백"
-        elif i == 11:
-            name = digit2name.get(digit, "") + "천"
-        elif i == 12:
-            name = digit2name.get(digit, "") + "조"
-        elif i == 13:
-            name = digit2name.get(digit, "") + "십"
-        elif i == 14:
-            name = digit2name.get(digit, "") + "백"
-        elif i == 15:
-            name = digit2name.get(digit, "") + "천"
-        elif i == 16:
-            name = digit2name.get(digit, "") + "경"
-        elif i == 17:
-            name = digit2name.get(digit, "") + "십"
-        elif i == 18:
-            name = digit2name.get(digit, "") + "백"
-        elif i == 19:
-            name = digit2name.get(digit, "") + "천"
-        if name is not None:
-            spelledout.append(name)
-        else:
+    if len(num) > 20:
+        if len(num.lstrip("0")) > 20:
             return num
-    return "".join(elem for elem in spelledout)
+        num = num[-20:]
+    spelledout = []
+    g = (len(num) - 1) // 4
+    start = 0
+    for stop in range(len(num) - 4 * g, len(num) + 1, 4):
+        spelledout.append(spell_group(num[start:stop], g, sino))
+        start = stop
+        g -= 1
+    return "".join(spelledout)
+
+
+@lru_cache(maxsize=None)
+def spell_group(chunk, g, sino=True):
+    # at most 11110 distinct chunks per group, so the cache stays bounded
+    if not chunk.strip("0"):
+        return ""
+    places = (SINO_GROUPS if sino else NATIVE_GROUPS)[g]
+    top = len(chunk) - 1
+    return "".join(places[top - i][digit] for i, digit in enumerate(chunk)) + GROUP_UNITS[g]
+
+
+# a number, followed by a bound noun if MeCab tagged one, or a decimal
+# that is not part of a dotted run such as a version or an address
+NUMBER = re.compile(r"(?<!\d\.)((?:\d[\d,]*\d|\d)\.\d+)(?![\d,.]*\d)"
+                    r"|(\d[\d,]*\d|\d)(?:(\s*[ㄱ-힣]+)(?=/B))?")
+YUK = re.compile("[십백]육")
+# what convert_num can change
+NUMERIC = re.compile("\\d|[십백]육")
+
+
+def spell_num(m):
+    decimal, num, bn = m.groups()
+    if decimal is not None:
+        return process_num(decimal)
+    if bn is None:
+        return process_num(num, sino=True)
+    if bn.lstrip() in BOUND_NOUNS:
+        return process_num(num, sino=False) + bn
+    return process_num(num, sino=True) + bn
 
 
 def convert_num(string):
-    global BOUND_NOUNS
-    tokens = set(re.findall(r"(\d[\d,]*\d|\d)(\s*[ㄱ-힣]+(?=/B))", string))
-    tokens = sorted(tokens, key=len, reverse=True)
-    for token in tokens:
-        num, bn = token
-        bn_s = bn.lstrip()
-        if bn_s in BOUND_NOUNS:
-            spelledout = process_num(num, sino=False)
-        else:
-            spelledout = process_num(num, sino=True)
-        string = string.replace(f"{num}{bn}/B", f"{spelledout}{bn}/B")
-    remain = set(re.findall(r"(\d[\d,]*\d|\d)", string))
-    remain = sorted(remain, key=len, reverse=True)
-    for num in remain:
-        string = string.replace(num, process_num(num, sino=True))
-    digits = "0123456789"
-    names = "영일이삼사오육칠팔구"
-    for d, n in zip(digits, names):
-        string = string.replace(d, n)
-    pairs = [("십육", "심뉵"), ("백육", "뱅뉵")]
-    for str1, str2 in pairs:
-        string = string.replace(str1, str2)
+    string = NUMBER.sub(spell_num, string)
+    string = string.translate(DIGIT2NAME)
+    string = YUK.sub(lambda m: {"십육": "심뉵", "백육": "뱅뉵"}[m.group()], string)
     return string
 
 
+# The stages of preprocess that are skipped when a prefilter finds nothing for them to do, in order.
+PREFILTERED = ("idioms", "convert_eng", "annotate", "convert_num")
+
+# Joins sentences in G2p.batch. It is a blank but not a newline,
+# so no rule can match across it and none can create or consume it.
+BATCH_SEP = "\x1e"
+
+# Blanks after sentence-final punctuation (and any closing quotes), and blanks with a newline.
+# No rule reaches across punctuation or a newline, so text split there converts the same piece by piece.
+SENTENCE_BREAK = re.compile("[.!?…。][\"'”’»)\\]]*(\\s+)|(\\s*\n\\s*)")
+# Where a sentence longer than max_chars is split further.
+CLAUSE_BREAK = re.compile("[,;:](\\s+)")
+
+
+def split_breaks(text, breaks):
+    pieces, seps = [], []
+    start = 0
+    for m in breaks.finditer(text):
+        i, j = m.span(m.lastindex)
+        pieces.append(text[start:i])
+        seps.append(text[i:j])
+        start = j
+    pieces.append(text[start:])
+    seps.append("")
+    return pieces, seps
+
+
+def split_document(text, max_chars=1000):
+    '''Splits `text` at sentence breaks into (pieces, separators), so that
+    "".join(piece + sep for piece, sep in zip(pieces, separators)) == text.
+
+    Sentences longer than `max_chars` are split at clause breaks as well, where there are any.
+    '''
+    pieces, seps = [], []
+    for sent, sep in zip(*split_breaks(text, SENTENCE_BREAK)):
+        if len(sent) > max_chars:
+            clauses, clause_seps = split_breaks(sent, CLAUSE_BREAK)
+            clause_seps[-1] = sep
+            pieces.extend(clauses)
+            seps.extend(clause_seps)
+        else:
+            pieces.append(sent)
+            seps.append(sep)
+    return pieces, seps
+
+
 class G2p(object):
-    def __init__(self):
-        self.mecab = mecab.MeCab()
-        self.table = parse_table()
-        self.cmu = cmudict.dict()
-        self.rule2text = get_rule_id2text()
+    '''Converts Korean text to its pronunciation.
+
+    An instance can be used from several threads at once. The rules, the table and the CMU dictionary
+    are read-only and shared with every other instance in the process, the caches take a lock,
+    and each thread gets its own MeCab tagger.
+    '''
+    def __init__(self, idioms=None, cmu=None, cache_size=0, eng_cache_size=10000):
+        self.local = threading.local()
+        self.table, self.compiled_table = shared_table()
+        self.rules = COMPILED_RULES
+        self.links = COMPILED_LINKS
+        self.cmu = shared_cmu() if cmu is None else cmu
+        # the default store was transliterated with the default dictionary
+        self.eng_cache = EngCache(self.cmu, eng_cache_size, ENG_STORE_PATH if self.cmu is shared_cmu() else None)
+        self.rule2text = rule_id2text
         self.idioms_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "idioms.txt")
+        # results keyed on (string, descriptive, group_vowels, to_syl). disabled if cache_size is 0.
+        self.cache = LRUCache(cache_size) if cache_size > 0 else None
+        self.skips = [0] * len(PREFILTERED)
+        self.preprocessed = 0
+        self.skips_lock = threading.Lock()
+        self.load_idioms(idioms)
+
+    @property
+    def mecab(self):
+        '''The MeCab tagger of the calling thread.'''
+        tagger = getattr(self.local, "mecab", None)
+        if tagger is None:
+            tagger = self.local.mecab = mecab.MeCab()
+        return tagger
+
+    def load_idioms(self, idioms=None):
+        '''(Re)loads idioms from `idioms`, or from `self.idioms_path` if it is None.'''
+        if idioms is None:
+            idioms = self.idioms_path
+        elif isinstance(idioms, str):
+            self.idioms_path = idioms
+        self.compiled_idioms = CompiledIdioms(idioms)
+        self.cache_clear()
+
+    def cache_info(self):
+        '''Returns (hits, misses, maxsize, currsize) of the result cache, or None if it is disabled.'''
+        return self.cache.info() if self.cache is not None else None
+
+    def cache_clear(self):
+        if self.cache is not None:
+            self.cache.clear()
+
+    def skip_info(self):
+        '''Returns {stage: number of strings} that skipped each stage in PREFILTERED,
+        and under "strings" the number of strings preprocessed, traced ones aside.'''
+        with self.skips_lock:
+            return dict(zip(PREFILTERED, self.skips), strings=self.preprocessed)
 
     def idioms(self, string, verbose=False):
-        rule = "from idioms.txt"
-        out = string
-
-        for line in open(self.idioms_path, 'r', encoding="utf8"):
-            line = line.split("#")[0].strip()
-            if "===" in line:
-                str1, str2 = line.split("===")
-                out = re.sub(str1, str2, out)
-        gloss(verbose, out, string, rule)
+        out = self.compiled_idioms(string)
+        if verbose:
+            gloss(verbose, out, string, "from idioms.txt")
 
         return out
 
-    def __call__(self, string, descriptive=False, verbose=False, group_vowels=False, to_syl=True):
-        string = self.idioms(string, verbose)
-        string = convert_eng(string, self.cmu)
-        string = annotate(string, self.mecab)
-        string = convert_num(string)
-        inp = h2j(string)
-        inp = jyeo(inp, verbose)
-        inp = ye(inp, descriptive, verbose)
-        inp = consonant_ui(inp, verbose)
-        inp = josa_ui(inp, descriptive, verbose)
-        inp = vowel_ui(inp, descriptive, verbose)
-        inp = jamo(inp, verbose)
-        inp = rieulgiyeok(inp, verbose)
-        inp = rieulbieub(inp, verbose)
-        inp = verb_nieun(inp, verbose)
-        inp = balb(inp, verbose)
-        inp = palatalize(inp, verbose)
-        inp = modifying_rieul(inp, verbose)
-        inp = re.sub("/[PJEB]", "", inp)
-        for str1, str2, rule_ids in self.table:
-            _inp = inp
-            inp = re.sub(str1, str2, inp)
-            if len(rule_ids) > 0:
-                rule = "\n".join(self.rule2text.get(rule_id, "") for rule_id in rule_ids)
-            else:
-                rule = ""
-            gloss(verbose, inp, _inp, rule)
-        inp = link1(inp, verbose)
-        inp = link2(inp, verbose)
-        # inp = link3(inp, verbose)
-        inp = link4(inp, verbose)
+    def gloss(self, event):
+        '''Prints a TraceEvent of the idioms or of a rule the way verbose does.'''
+        if event.stage == "idioms":
+            rule = "from idioms.txt"
+        elif event.stage == "table":
+            rule = "\n".join(self.rule2text.get(rule_id, "") for rule_id in event.rule)
+        elif event.stage in ("rules", "links"):
+            rule = rule_id2text.get(event.rule, "")
+        else:
+            return
+        gloss(True, event.after, event.before, rule)
+
+    def tracer(self, verbose=False, trace=None):
+        '''Returns the callback that receives the TraceEvents for verbose and trace, or None if both are off.'''
+        if not verbose:
+            return trace
+        if trace is None:
+            return self.gloss
+        return lambda event: (self.gloss(event), trace(event))
+
+    def preprocess(self, string, verbose=False, trace=None):
+        trace = self.tracer(verbose, trace)
+        if trace is None:
+            # each stage runs only if its prefilter finds something for it to do; MeCab, only if a tag can matter
+            idioms = self.compiled_idioms.fires(string)
+            if idioms:
+                string = self.compiled_idioms.apply(string)
+            eng = ENG_WORD.search(string) is not None
+            if eng:
+                string = convert_eng(string, self.cmu, self.eng_cache)
+            tags = TAG_SITES.search(string) is not None
+            if tags:
+                string = annotate(string, self.mecab)
+            num = NUMERIC.search(string) is not None
+            if num:
+                string = convert_num(string)
+            with self.skips_lock:
+                self.preprocessed += 1
+                for i, ran in enumerate((idioms, eng, tags, num)):
+                    self.skips[i] += not ran
+            return string
+
+        string = traced(trace, "idioms", None, self.compiled_idioms, string)
+        string = traced(trace, "convert_eng", None, lambda s: convert_eng(s, self.cmu, self.eng_cache), string)
+        string = traced(trace, "annotate", None, lambda s: annotate(s, self.mecab), string)
+        return traced(trace, "convert_num", None, convert_num, string)
+
+    def apply_rules(self, inp, descriptive=False, verbose=False, group_vowels=False, to_syl=True, trace=None):
+        trace = self.tracer(verbose, trace)
+        if trace is None:
+            inp = self.rules(inp, descriptive)
+            inp = self.compiled_table(inp)
+            inp = self.links(inp, descriptive)
+            if group_vowels:
+                inp = group(inp)
+            if to_syl:
+                inp = compose(inp)
+            return inp
+
+        # the table is applied rule by rule here, so that each gets its own event
+        for rule in self.rules.rules:
+            inp = traced(trace, "rules", rule.rule_id, lambda s: rule(s, descriptive), inp)
+        for pattern, str2, rule_ids in self.compiled_table.rules:
+            inp = traced(trace, "table", tuple(rule_ids), lambda s: pattern.sub(str2, s), inp)
+        for rule in self.links.rules:
+            inp = traced(trace, "links", rule.rule_id, lambda s: rule(s, descriptive), inp)
         if group_vowels:
-            inp = group(inp)
+            inp = traced(trace, "group", None, group, inp)
         if to_syl:
-            inp = compose(inp)
+            inp = traced(trace, "compose", None, compose, inp)
         return inp
+
+    def __call__(self, string, descriptive=False, verbose=False, group_vowels=False, to_syl=True, trace=None):
+        '''Converts `string`.
+
+        `trace` is a callback that receives a TraceEvent for each stage and each rule, in order.
+        With trace=True, returns (output, list of TraceEvents) instead.
+        '''
+        events = None
+        if trace is True:
+            events = []
+            trace = events.append
+        trace = self.tracer(verbose, trace)
+        if trace is not None:
+            string = self.preprocess(string, trace=trace)
+            inp = traced(trace, "decompose", None, decompose, string)
+            out = self.apply_rules(inp, descriptive, False, group_vowels, to_syl, trace)
+            return out if events is None else (out, events)
+
+        if self.cache is not None:
+            key = (string, descriptive, group_vowels, to_syl)
+            out = self.cache.get(key)
+            if out is None:
+                inp = decompose(self.preprocess(string))
+                out = self.apply_rules(inp, descriptive, False, group_vowels, to_syl)
+                self.cache.put(key, out)
+            return out
+
+        inp = decompose(self.preprocess(string))
+        return self.apply_rules(inp, descriptive, False, group_vowels, to_syl)
+
+    def batch(self, sentences, descriptive=False, verbose=False, group_vowels=False, to_syl=True, batch_size=256,
+              backend="python"):
+        '''Converts an iterable of sentences. Returns the same list as calling self on each of them.
+
+        Every distinct sentence is preprocessed on its own, because MeCab's analysis depends on the whole input.
+        The jamo rules never reach across BATCH_SEP, so they run once over each batch joined by it.
+        With backend="numpy", the table and the linking rules run on arrays with self.vectorized, which needs NumPy
+        and pays off for large batch sizes.
+        '''
+        if backend not in ("python", "numpy"):
+            raise ValueError(f"unknown backend: {backend}")
+        if verbose:
+            return [self(sent, descriptive, verbose, group_vowels, to_syl) for sent in sentences]
+
+        out = []
+        chunk = []
+        for sent in sentences:
+            chunk.append(sent)
+            if len(chunk) == batch_size:
+                out.extend(self._convert_chunk(chunk, descriptive, group_vowels, to_syl, backend))
+                chunk = []
+        if len(chunk) > 0:
+            out.extend(self._convert_chunk(chunk, descriptive, group_vowels, to_syl, backend))
+        return out
+
+    def ids(self, string, descriptive=False, group_vowels=False):
+        '''Converts `string` like self(string, to_syl=False), straight to the IDs of g2pk.phonemes.SYMBOLS.
+        Returns an array('H').'''
+        return to_ids(self(string, descriptive, False, group_vowels, False))
+
+    def batch_ids(self, sentences, descriptive=False, group_vowels=False, batch_size=256, backend="python"):
+        '''Converts sentences like batch with to_syl=False, straight to the IDs of g2pk.phonemes.SYMBOLS.
+        Needs NumPy. Returns (ids, lengths): the IDs padded with PAD to the longest, of shape
+        (number of sentences, longest), and the length of each.
+
+        With backend="numpy", the IDs are looked up on the arrays of self.vectorized, with no strings in between.
+        '''
+        if backend == "numpy":
+            import numpy as np
+            sentences = list(sentences)
+            parts = []
+            for i in range(0, len(sentences), batch_size):
+                chunk = sentences[i:i + batch_size]
+                sents = {sent: j for j, sent in enumerate(dict.fromkeys(chunk))}
+                ids, lengths = self.vectorized.ids([self.preprocess(sent) for sent in sents], descriptive, group_vowels)
+                rows = [sents[sent] for sent in chunk]
+                parts.append((ids[rows], lengths[rows]))
+            if len(parts) == 0:
+                return pad_ids([])
+            width = max(ids.shape[1] for ids, _ in parts)
+            return (np.concatenate([np.pad(ids, ((0, 0), (0, width - ids.shape[1]))) for ids, _ in parts]),
+                    np.concatenate([lengths for _, lengths in parts]))
+        outs = self.batch(sentences, descriptive, False, group_vowels, False, batch_size, backend)
+        return pad_ids([to_ids(out) for out in outs])
+
+    def map(self, texts, threads=None, descriptive=False, group_vowels=False, to_syl=True, chunksize=64):
+        '''Converts `texts` with `threads` threads sharing this G2p, and returns the results in order.
+
+        Chunks of `chunksize` texts go through batch. The threads run in parallel only
+        while MeCab has released the GIL; for the rest of the work use convert_parallel.
+        '''
+        if threads is None:
+            threads = os.cpu_count() or 1
+        texts = list(texts)
+        chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+        with ThreadPoolExecutor(threads) as executor:
+            outs = executor.map(lambda chunk: self.batch(chunk, descriptive, False, group_vowels, to_syl), chunks)
+            return [out for chunk in outs for out in chunk]
+
+    def document(self, text, descriptive=False, group_vowels=False, to_syl=True, max_chars=1000, workers=1):
+        '''Converts a long text, such as a whole document, sentence by sentence.
+
+        The text is split with split_document, the sentences go through batch, or through
+        convert_parallel with `workers` processes, and the results are joined with the blanks
+        between them as they were. The time taken grows linearly with the length of the text.
+        Unlike self(text), MeCab never sees more than one sentence, nor a newline, at a time.
+        '''
+        pieces, seps = split_document(text, max_chars)
+        if workers > 1:
+            from g2pk.parallel import convert_parallel
+            # the idioms as loaded, which need not have come from a file
+            idioms = [(str1, str2) for str1, _, str2 in self.compiled_idioms.rules]
+            outs = convert_parallel(pieces, workers, descriptive=descriptive, group_vowels=group_vowels,
+                                    to_syl=to_syl, idioms=idioms)
+        else:
+            outs = self.batch(pieces, descriptive, False, group_vowels, to_syl)
+        return "".join(out + sep for out, sep in zip(outs, seps))
+
+    @property
+    def vectorized(self):
+        '''The VectorizedRules of this G2p, built on first use.'''
+        rules = getattr(self, "_vectorized", None)
+        if rules is None:
+            from g2pk.vectorized import VectorizedRules
+            rules = self._vectorized = VectorizedRules(self)
+        return rules
+
+    def _convert_chunk(self, chunk, descriptive, group_vowels, to_syl, backend="python"):
+        sent2out = dict()
+        if self.cache is not None:
+            for sent in dict.fromkeys(chunk):
+                out = self.cache.get((sent, descriptive, group_vowels, to_syl))
+                if out is not None:
+                    sent2out[sent] = out
+        sents = [sent for sent in dict.fromkeys(chunk) if sent not in sent2out]
+
+        strings = [self.preprocess(sent) for sent in sents]
+        converted = []
+        if backend == "numpy" and len(strings) > 0:
+            converted = self.vectorized(strings, descriptive, group_vowels, to_syl)
+        elif not any(BATCH_SEP in string for string in strings):
+            inp = decompose(BATCH_SEP.join(strings))
+            converted = self.apply_rules(inp, descriptive, False, group_vowels, to_syl).split(BATCH_SEP)
+        if len(converted) != len(strings):
+            converted = [self.apply_rules(decompose(string), descriptive, False, group_vowels, to_syl) for string in strings]
+
+        for sent, out in zip(sents, converted):
+            sent2out[sent] = out
+            if self.cache is not None:
+                self.cache.put((sent, descriptive, group_vowels, to_syl), out)
+        return [sent2out[sent] for sent in chunk]
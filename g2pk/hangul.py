@@ -0,0 +1,44 @@
+import re
+
+# Hangul syllables are laid out arithmetically:
+# 0xAC00 + (lead * 21 + vowel) * 28 + tail
+LEADS = [chr(0x1100 + i) for i in range(19)]
+VOWELS = [chr(0x1161 + i) for i in range(21)]
+TAILS = [""] + [chr(0x11A8 + i) for i in range(27)]
+
+SYLLABLES = [chr(0xAC00 + i) for i in range(11172)]
+JAMO = [LEADS[i // 588] + VOWELS[i // 28 % 21] + TAILS[i % 28] for i in range(11172)]
+
+DECOMPOSE = dict(zip(range(0xAC00, 0xAC00 + 11172), JAMO))
+COMPOSE = dict(zip(JAMO, SYLLABLES))
+# the tail of every syllable, "" if it has none
+FINALS = dict(zip(SYLLABLES, (TAILS[i % 28] for i in range(11172))))
+
+SYLLABLE = re.compile("[ᄀ-ᄒ]?[ᅡ-ᅵ][ᆨ-ᇂ]?")
+
+
+def decompose(string):
+    '''Splits every Hangul syllable into U+11xx jamo, like jamo.h2j.'''
+    return string.translate(DECOMPOSE)
+
+
+def compose(letters):
+    '''Composes jamo into syllables in one pass, like the old regex passes.
+
+    A vowel without a lead gets ᄋ, except right after another vowel that
+    just got one, as the old `re.sub` left every other vowel of a run bare.
+    '''
+    last = -1
+
+    def syllable(m):
+        nonlocal last
+        jamo = m.group()
+        if jamo[0] >= "ᅡ":
+            start = m.start()
+            if start == last:
+                return jamo
+            last = start + 1
+            jamo = "ᄋ" + jamo
+        return COMPOSE[jamo]
+
+    return SYLLABLE.sub(syllable, letters)
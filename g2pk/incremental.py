@@ -0,0 +1,116 @@
+from g2pk.g2pk import G2p, align, convert_eng, convert_num
+from g2pk.hangul import decompose
+
+
+def eojeol_tokens(string, tokens):
+    '''Returns MeCab's `tokens` for `string` grouped by the eojeol of `string` each is found in.'''
+    groups = [[] for _ in range(string.count(" ") + 1)]
+    eojeol = pos = 0
+    for token in tokens:
+        found = string.find(token[0], pos)
+        if found >= 0:
+            eojeol += string.count(" ", pos, found)
+            pos = found + len(token[0])
+        groups[eojeol].append(token)
+    return [tuple(group) for group in groups]
+
+
+def analyze(g2p, words):
+    '''Returns the annotated jamo of `words` and MeCab's tokens in each, preprocessing them together.'''
+    string = convert_eng(g2p.compiled_idioms(" ".join(words)), g2p.cmu, g2p.eng_cache)
+    tokens = g2p.mecab.pos(string)
+    jamo = decompose(convert_num(align(string, tokens))).split(" ")
+    if len(jamo) == len(words) and string.count(" ") + 1 == len(words):
+        return jamo, eojeol_tokens(string, tokens)
+    # something added or removed a blank; give up on the context
+    return [decompose(g2p.preprocess(word)) for word in words], [()] * len(words)
+
+
+def apply_rules(g2p, jamo, **opts):
+    '''Returns the pronunciation of each of the eojeols `jamo`, with the rules applied across them.'''
+    outs = g2p.apply_rules(" ".join(jamo), **opts).split(" ")
+    if len(outs) == len(jamo):
+        return outs
+    return [g2p.apply_rules(inp, **opts) for inp in jamo]
+
+
+class IncrementalG2p(object):
+    '''Keeps the pronunciation of a text up to date as it is edited, e.g. in an editor, eojeol by eojeol.
+
+    The text is held as a list of eojeols, split on blanks, each with its annotated jamo, MeCab's tokens in it
+    and its pronunciation. replace() swaps some eojeols for new ones. MeCab analyzes them again with `context`
+    eojeols on each side, or more as long as that changes its analysis of the eojeols further out, which updates
+    the annotated jamo of the new eojeols and of their neighbours. The rules never reach across more than one
+    blank, so only the eojeols next to those can change pronunciation, and only they are converted again.
+    The result is the same as converting the whole text again unless the edit changes MeCab's analysis of an eojeol
+    past one whose analysis stays the same. The time an edit takes depends on the size of the edit and on how far
+    it changes MeCab's analysis, not on the size of the text.
+    '''
+    def __init__(self, text="", g2p=None, context=2, **opts):
+        self.g2p = G2p() if g2p is None else g2p
+        self.context = max(context, 1)
+        self.opts = opts
+        self.words = []
+        self.jamo = []
+        self.tokens = []
+        self.outs = []
+        self.replace(0, 0, text)
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def text(self):
+        return " ".join(self.words)
+
+    @property
+    def pronunciation(self):
+        return " ".join(self.outs)
+
+    def replace(self, start, stop, text):
+        '''Replaces the eojeols from `start` up to `stop` with those of `text`, which may be "".
+
+        Returns (i, outs): the eojeols from i on whose pronunciation was converted again, and their pronunciation.
+        '''
+        new = text.split(" ") if text else []
+        if len(self.words) == 0 and len(new) > 0:
+            self.words = new
+            self.jamo, self.tokens = analyze(self.g2p, new)
+            self.outs = apply_rules(self.g2p, self.jamo, **self.opts)
+            return 0, list(self.outs)
+
+        self.words[start:stop] = new
+        self.jamo[start:stop] = [""] * len(new)
+        self.tokens[start:stop] = [None] * len(new)
+        self.outs[start:stop] = [""] * len(new)
+        if len(self.words) == 0:
+            return 0, []
+
+        # MeCab sees `context` eojeols on each side, and all but the outermost take its new analysis. Its analysis
+        # of an eojeol can depend on eojeols further away, so the window widens by one eojeol on each side until
+        # that leaves its analysis of the inner eojeols as it was and that of the new outermost ones as stored.
+        stop = start + len(new)
+        n = len(self.words)
+        a, b = max(start - self.context, 0), min(stop + self.context, n)
+        jamo, tokens = analyze(self.g2p, self.words[a:b])
+        while a > 0 or b < n:
+            lo, hi = a + (a > 0), b - (b < n)
+            a2, b2 = max(a - 1, 0), min(b + 1, n)
+            wider_jamo, wider_tokens = analyze(self.g2p, self.words[a2:b2])
+            settled = (wider_jamo[lo - a2:hi - a2] == jamo[lo - a:hi - a]
+                       and wider_tokens[lo - a2:hi - a2] == tokens[lo - a:hi - a]
+                       and (a2 == a or (wider_jamo[0], wider_tokens[0]) == (self.jamo[a2], self.tokens[a2]))
+                       and (b2 == b or (wider_jamo[-1], wider_tokens[-1]) == (self.jamo[b2 - 1], self.tokens[b2 - 1])))
+            a, b, jamo, tokens = a2, b2, wider_jamo, wider_tokens
+            if settled:
+                break
+        lo, hi = a + (a > 0), b - (b < n)
+        self.jamo[lo:hi] = jamo[lo - a:hi - a]
+        self.tokens[lo:hi] = tokens[lo - a:hi - a]
+
+        # a rule can change the eojeols on either side of a changed one, given one more on each side
+        lo, hi = max(lo - 1, 0), min(hi + 1, len(self.words))
+        a, b = max(lo - 1, 0), min(hi + 1, len(self.words))
+        outs = apply_rules(self.g2p, self.jamo[a:b], **self.opts)
+        self.outs[lo:hi] = outs[lo - a:hi - a]
+        return lo, self.outs[lo:hi]
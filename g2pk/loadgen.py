@@ -0,0 +1,102 @@
+'''Generates load for g2pk.server, or for AsyncG2p in-process, and reports throughput and latency.
+
+    python -m g2pk.loadgen [--url http://127.0.0.1:8000/convert] [-c CONCURRENCY] [-n REQUESTS] [--corpus FILE]
+    python -m g2pk.loadgen --inproc [-j WORKERS] [-c CONCURRENCY] [-n REQUESTS]
+
+Every client sends the sentences of the corpus in turn and waits for each answer before sending the next.
+'''
+import argparse
+import asyncio
+import json
+import time
+from itertools import cycle
+from urllib.parse import urlsplit
+from g2pk.aio import AsyncG2p
+from g2pk.bench import CORPUS_PATH, load_corpus, percentile
+from g2pk.server import read_message, run
+
+
+class HttpClient(object):
+    '''One kept-alive connection to g2pk.server.'''
+    def __init__(self, url):
+        url = urlsplit(url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.path = url.path or "/convert"
+        self.reader = self.writer = None
+
+    async def convert(self, text):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps({"text": text}, ensure_ascii=False).encode("utf8")
+        self.writer.write(f"POST {self.path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        message = await read_message(self.reader)
+        if message is None:
+            raise ConnectionError("the server closed the connection")
+        status, _, body = message
+        if status.split(" ")[1] != "200":
+            raise RuntimeError(f"{status}: {body.decode('utf8')}")
+        return json.loads(body.decode("utf8"))["text"]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+async def client(convert, sents, requests, latencies):
+    for sent in sents:
+        if requests[0] <= 0:
+            return
+        requests[0] -= 1
+        start = time.perf_counter()
+        await convert(sent)
+        latencies.append(time.perf_counter() - start)
+
+
+async def generate(args):
+    sents = load_corpus(args.corpus)
+    latencies = []
+    requests = [args.requests]
+    if args.inproc:
+        g2p = AsyncG2p(workers=args.workers, max_batch=args.max_batch, max_delay=args.max_delay / 1000)
+        g2p.start()
+        # the first request loads the dictionaries
+        await g2p.convert("warm up with English: g2p")
+        converters = [g2p.convert] * args.concurrency
+    else:
+        clients = [HttpClient(args.url) for _ in range(args.concurrency)]
+        converters = [c.convert for c in clients]
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*[client(convert, cycle(sents[i::args.concurrency] or sents), requests, latencies)
+                               for i, convert in enumerate(converters)])
+    finally:
+        elapsed = time.perf_counter() - start
+        if args.inproc:
+            await g2p.close()
+        else:
+            for c in clients:
+                c.close()
+
+    print(f"{len(latencies)} requests, {args.concurrency} clients: {len(latencies) / elapsed:.0f} req/s, "
+          f"p50 {percentile(latencies, .5) * 1e3:.1f} ms, p99 {percentile(latencies, .99) * 1e3:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m g2pk.loadgen", description="Generates load for g2pk.server.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/convert")
+    parser.add_argument("--inproc", action="store_true", help="drive an AsyncG2p in this process instead of a server")
+    parser.add_argument("-c", "--concurrency", type=int, default=32, help="clients sending at the same time")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("--corpus", default=CORPUS_PATH, help="one sentence per line. rules.txt examples are added")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="with --inproc, as for g2pk.server")
+    parser.add_argument("--max-batch", type=int, default=64, help="with --inproc, as for g2pk.server")
+    parser.add_argument("--max-delay", type=float, default=2., help="with --inproc, as for g2pk.server")
+    args = parser.parse_args(argv)
+    run(generate(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import multiprocessing as mp
+from collections import deque
+from itertools import islice
+from g2pk.g2pk import G2p, shared_cmu
+
+# Loaded once in the parent so that forked workers share it instead of reloading it.
+_cmu = None
+# One G2p per worker process.
+_g2p = None
+
+
+def _init_worker(idioms):
+    global _g2p
+    _g2p = G2p(idioms=idioms, cmu=_cmu)
+
+
+def _convert(chunk, descriptive, group_vowels, to_syl):
+    return _g2p.batch(chunk, descriptive=descriptive, group_vowels=group_vowels, to_syl=to_syl)
+
+
+def chunked(lines, chunksize):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunksize))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def start_pool(workers=None, idioms=None):
+    '''Returns a multiprocessing.Pool whose workers each hold a G2p, for use with _convert.'''
+    global _cmu
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if _cmu is None and mp.get_start_method() == "fork":
+        _cmu = shared_cmu()
+        _cmu.load()
+    return mp.Pool(workers, initializer=_init_worker, initargs=(idioms,))
+
+
+def convert_parallel(lines, workers=None, chunksize=256, descriptive=False, group_vowels=False, to_syl=True,
+                     idioms=None):
+    '''Converts `lines` with `workers` processes, yielding the results in input order.
+
+    `lines` is consumed lazily; at most two chunks per worker are in flight at a time,
+    so memory stays bounded however long the input is.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with start_pool(workers, idioms) as pool:
+        pending = deque()
+        for chunk in chunked(lines, chunksize):
+            pending.append(pool.apply_async(_convert, (chunk, descriptive, group_vowels, to_syl)))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().get()
+        while len(pending) > 0:
+            yield from pending.popleft().get()
@@ -0,0 +1,45 @@
+'''Integer IDs for the output of G2p with to_syl=False, for models that take phoneme IDs.
+
+The vocabulary is stable: a symbol keeps its ID, and new symbols are only ever appended.
+'''
+import codecs
+import sys
+from array import array
+from g2pk.hangul import LEADS, VOWELS, TAILS
+
+PAD, UNK = 0, 1
+# Every ID fits in a byte, which to_ids relies on.
+SYMBOLS = (["<pad>", "<unk>", " ", "\n", "!", "\"", "'", "(", ")", ",", "-", ".", ":", ";", "?", "~"]
+           + LEADS + VOWELS + TAILS[1:])
+SYMBOL2ID = {symbol: i for i, symbol in enumerate(SYMBOLS)}
+
+# maps every symbol to the character whose code point is its ID, and any other character below it to UNK
+TRANSLATION = [chr(UNK)] * (max(map(ord, LEADS + VOWELS + TAILS[1:])) + 1)
+for i, symbol in enumerate(SYMBOLS[2:], 2):
+    TRANSLATION[ord(symbol)] = chr(i)
+TRANSLATION = "".join(TRANSLATION)
+UTF16 = "utf-16-le" if sys.byteorder == "little" else "utf-16-be"
+
+# the characters that TRANSLATION leaves as they are become UNK when encoded
+codecs.register_error("g2pk.unk", lambda e: (chr(UNK) * (e.end - e.start), e.end))
+
+
+def to_ids(jamo):
+    '''Returns the IDs of the characters of `jamo`, UNK for those not in SYMBOLS, as an array('H').'''
+    ids = jamo.translate(TRANSLATION).encode("latin-1", "g2pk.unk")
+    return array("H", ids.decode("latin-1").encode(UTF16))
+
+
+def from_ids(ids):
+    '''Returns the jamo string of `ids`, leaving out PAD.'''
+    return "".join(SYMBOLS[i] for i in ids if i != PAD)
+
+
+def pad_ids(rows):
+    '''Returns (ids, lengths) of the ID arrays `rows` as NumPy arrays:
+    ids of shape (len(rows), longest row) padded with PAD, and the length of each row.'''
+    import numpy as np
+    lengths = np.fromiter(map(len, rows), np.int64, len(rows))
+    ids = np.full((len(rows), int(lengths.max(initial=0))), PAD, np.uint16)
+    ids[np.arange(ids.shape[1]) < lengths[:, None]] = np.frombuffer(b"".join(row.tobytes() for row in rows), np.uint16)
+    return ids, lengths
@@ -0,0 +1,155 @@
+'''Serves G2p over HTTP or stdio through AsyncG2p.
+
+    python -m g2pk.server [--host HOST] [--port PORT] [-j WORKERS]
+    python -m g2pk.server --stdio
+
+Over HTTP, POST /convert takes {"text": ..., "descriptive": false, "group_vowels": false, "to_syl": true}
+and returns {"text": pronunciation}; the options must be JSON booleans. Errors come back as {"error": ...},
+with status 400 for a bad request and 500 if the conversion fails. GET /health returns {"pending": number of
+queued requests}. Connections are kept alive. Over stdio, every line read is answered with its pronunciation, in order,
+or with "error: " and the error if its conversion fails.
+'''
+import argparse
+import asyncio
+import json
+import sys
+from g2pk.aio import AsyncG2p
+
+OPTIONS = ("descriptive", "group_vowels", "to_syl")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def run(coro):
+    # asyncio.run is new in Python 3.7
+    if hasattr(asyncio, "run"):
+        return asyncio.run(coro)
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+async def read_message(reader):
+    '''Reads an HTTP/1.1 request or response. Returns (start line, headers, body), or None at EOF.'''
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict()
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get("content-length", 0)))
+    return lines[0], headers, body
+
+
+def write_response(writer, status, obj):
+    body = json.dumps(obj, ensure_ascii=False).encode("utf8")
+    writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+
+
+async def respond(g2p, method, path, body):
+    if path == "/health":
+        return 200, {"pending": g2p.pending}
+    if path != "/convert":
+        return 404, {"error": "not found"}
+    if method != "POST":
+        return 405, {"error": "use POST"}
+    try:
+        request = json.loads(body.decode("utf8"))
+        text = request["text"]
+        opts = {name: request[name] for name in OPTIONS if name in request}
+    except (ValueError, KeyError, TypeError) as e:
+        return 400, {"error": f"expected {{\"text\": ...}}: {e!r}"}
+    if not isinstance(text, str):
+        return 400, {"error": "text must be a string"}
+    for name, value in opts.items():
+        if not isinstance(value, bool):
+            return 400, {"error": f"{name} must be true or false"}
+    try:
+        return 200, {"text": await g2p.convert(text, **opts)}
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        return 500, {"error": repr(e)}
+
+
+async def handle_http(g2p, reader, writer):
+    try:
+        while True:
+            message = await read_message(reader)
+            if message is None:
+                break
+            start, headers, body = message
+            method, path = start.split(" ")[:2]
+            write_response(writer, *await respond(g2p, method, path, body))
+            await writer.drain()
+            if headers.get("connection", "").lower() == "close":
+                break
+    except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_http(g2p, host, port):
+    server = await asyncio.start_server(lambda reader, writer: handle_http(g2p, reader, writer), host, port)
+    print(f"g2pk listening on http://{host}:{port}/convert", file=sys.stderr)
+    # Server is an async context manager only from Python 3.7
+    try:
+        async with g2p:
+            # until interrupted
+            await asyncio.get_event_loop().create_future()
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+async def serve_stdio(g2p, window=1024):
+    '''Answers each line of stdin on stdout, in order, with up to `window` lines in flight.'''
+    loop = asyncio.get_event_loop()
+    answers = asyncio.Queue(window)
+
+    async def write():
+        while True:
+            answer = await answers.get()
+            if answer is None:
+                return
+            try:
+                print(await answer, flush=True)
+            except Exception as e:
+                # an answer per line, so that the lines after it still match
+                print(f"error: {e!r}", flush=True)
+
+    async with g2p:
+        writer = asyncio.ensure_future(write())
+        while True:
+            line = await loop.run_in_executor(None, sys.stdin.readline)
+            if line == "":
+                break
+            await answers.put(asyncio.ensure_future(g2p.convert(line.rstrip("\r\n"))))
+        await answers.put(None)
+        await writer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m g2pk.server", description="Serves G2p over HTTP or stdio.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--stdio", action="store_true", help="answer lines of stdin on stdout instead of HTTP")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="batches converted at a time; >1 uses processes")
+    parser.add_argument("--max-batch", type=int, default=64, help="most requests converted together")
+    parser.add_argument("--max-delay", type=float, default=2., help="ms to wait for more requests to batch")
+    parser.add_argument("--max-pending", type=int, default=1024, help="queued requests before callers wait")
+    args = parser.parse_args(argv)
+
+    g2p = AsyncG2p(workers=args.workers, max_batch=args.max_batch, max_delay=args.max_delay / 1000,
+                   max_pending=args.max_pending)
+    try:
+        run(serve_stdio(g2p) if args.stdio else serve_http(g2p, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
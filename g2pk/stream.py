@@ -0,0 +1,63 @@
+from g2pk.g2pk import G2p
+from g2pk.incremental import analyze, apply_rules
+
+
+class StreamingG2p(object):
+    '''Converts text that arrives in fragments, e.g. from a streaming language model.
+
+    feed() returns the pronunciation of the eojeols that later input is not expected to change,
+    and flush() returns the rest. The last word of the input may not be complete yet, so MeCab never sees it.
+    An eojeol is emitted once one more complete eojeol to its right leaves MeCab's analysis of it as it was,
+    and so does its right neighbour, since the rules reach across one blank. At least the last `lookahead`
+    complete eojeols are held back, and the last `context` emitted ones are analyzed again with the new ones.
+    Joining everything returned gives the conversion of the whole text unless MeCab's analysis of an eojeol
+    changes with text further to the right than that, or further to the left than `context` eojeols.
+    '''
+    def __init__(self, g2p=None, lookahead=1, context=2, **opts):
+        self.g2p = G2p() if g2p is None else g2p
+        self.lookahead = lookahead
+        self.context = context
+        self.opts = opts
+        self.done = []  # the last emitted eojeols
+        self.pending = ""
+
+    def feed(self, text):
+        self.pending += text
+        # without a new complete eojeol, nothing more can be emitted
+        if " " not in text:
+            return ""
+        words = self.pending.split(" ")
+        complete = words[:-1]
+        if len(complete) < 2:
+            return ""
+        context = self.done[-self.context:] if self.context > 0 else []
+        jamo, tokens = analyze(self.g2p, context + complete)
+        shorter_jamo, shorter_tokens = analyze(self.g2p, context + complete[:-1])
+        settled = len(context)
+        while (settled < len(shorter_jamo)
+               and (jamo[settled], tokens[settled]) == (shorter_jamo[settled], shorter_tokens[settled])):
+            settled += 1
+        # the last settled eojeol waits for its right neighbour to settle
+        n = min(settled - 1 - len(context), len(complete) - self.lookahead)
+        if n <= 0:
+            return ""
+        outs = apply_rules(self.g2p, jamo[:settled], **self.opts)
+        self.done.extend(words[:n])
+        del self.done[:-max(self.context, 1)]
+        self.pending = " ".join(words[n:])
+        return " ".join(outs[len(context):len(context) + n]) + " "
+
+    def flush(self):
+        if self.pending == "":
+            return ""
+        words = self.pending.split(" ")
+        context = self.done[-self.context:] if self.context > 0 else []
+        jamo, _ = analyze(self.g2p, context + words)
+        outs = apply_rules(self.g2p, jamo, **self.opts)
+        self.done = []
+        self.pending = ""
+        return " ".join(outs[len(context):])
+
+    def reset(self):
+        self.done = []
+        self.pending = ""
@@ -0,0 +1,262 @@
+'''A NumPy backend for G2p.batch.
+
+The hand-written rules need MeCab's tags and keep running on strings. After them, every rule of the table
+and every linking rule rewrites one coda together with what follows it, and grouping and composing look at
+one jamo and its neighbours, so those run over a whole batch at once: the batch is packed into an array
+of code points, one padded row per utterance, and each coda is looked up by what follows it.
+'''
+import re
+import numpy as np
+from g2pk.g2pk import BATCH_SEP, group
+from g2pk.hangul import compose, decompose
+from g2pk.phonemes import PAD, TRANSLATION, UNK, to_ids
+
+FIRST_LEAD, LAST_LEAD = 0x1100, 0x1112
+FIRST_VOWEL, LAST_VOWEL = 0x1161, 0x1175
+FIRST_CODA, LAST_CODA = 0x11A8, 0x11C2
+BLANK = ord(" ")
+
+# What follows a coda, as indexed in the lookups: onset k at k, a blank and onset k at BLANK_ONSET + k,
+# any other non-word character, the end of the utterance, anything else, which no rule rewrites,
+# or another coda, which the lookups cannot handle.
+BLANK_ONSET = 19
+NON_WORD = 38
+END = 39
+OTHER = 40
+CODA = 41
+FOLLOWS = 42
+# Stands for the non-word character following a coda while the lookups are built.
+SENTINEL = "\ue000"
+# In a lookup, the character that was there.
+COPY = -1
+# Code points below this are classified with an array, the others one by one.
+CLASSIFIED = 0x3000
+
+NON_WORD_CHAR = re.compile(r"\W")
+
+# the phoneme ID of every code point up to the last jamo
+CODE2ID = np.array([ord(ch) for ch in TRANSLATION], np.uint16)
+CODE2ID[0] = PAD
+
+
+def follows():
+    '''Yields (index, what follows the coda) for each index of a lookup that can be rewritten.'''
+    for k in range(19):
+        yield k, chr(FIRST_LEAD + k)
+    for k in range(19):
+        yield BLANK_ONSET + k, " " + chr(FIRST_LEAD + k)
+    yield NON_WORD, SENTINEL
+    yield END, ""
+
+
+def build_lookup(rewrite, indices):
+    '''Returns (out, size, bad) for the function `rewrite` of a coda and what follows it.
+
+    out[coda * FOLLOWS + index] holds the codes of the result, right-aligned in the first `size` slots,
+    0 for a deleted character. `bad` is set where that cannot be done.
+    '''
+    out = np.zeros((27, FOLLOWS, 3), np.int32)
+    size = np.ones((27, FOLLOWS), np.int64)
+    bad = np.zeros((27, FOLLOWS), bool)
+    out[:, :, 0] = np.arange(FIRST_CODA, LAST_CODA + 1)[:, None]
+    bad[:, CODA] = True
+    for c in range(27):
+        coda = chr(FIRST_CODA + c)
+        for i, follow in follows():
+            if i not in indices:
+                continue
+            cluster = coda + follow
+            new = rewrite(cluster)
+            if len(new) > len(cluster) or i == NON_WORD and new.replace(SENTINEL, " ") != rewrite(coda + " "):
+                # it grows, or some non-word characters are treated differently
+                bad[c, i] = True
+                continue
+            codes = [0] * (len(cluster) - len(new)) + [COPY if ch == SENTINEL else ord(ch) for ch in new]
+            out[c, i, :len(codes)] = codes
+            size[c, i] = len(cluster)
+    return out.reshape(-1, 3), size.reshape(-1), bad.reshape(-1)
+
+
+def build_classes():
+    '''Returns the index of what follows a coda for every code point below CLASSIFIED.'''
+    classes = np.full(CLASSIFIED, OTHER, np.int64)
+    for code in range(1, CLASSIFIED):
+        if NON_WORD_CHAR.match(chr(code)):
+            classes[code] = NON_WORD
+    classes[FIRST_LEAD:LAST_LEAD + 1] = np.arange(19)
+    classes[FIRST_CODA:LAST_CODA + 1] = CODA
+    classes[0] = END
+    return classes
+
+
+def to_array(strings):
+    '''Packs `strings` into an array of code points, one row each, padded with at least two 0s.'''
+    lengths = np.fromiter(map(len, strings), np.int64, len(strings))
+    codes = np.frombuffer("".join(strings).encode("utf-32-le", "surrogatepass"), "<u4").astype(np.int32)
+    arr = np.zeros((len(strings), int(lengths.max(initial=0)) + 2), np.int32)
+    arr[np.arange(arr.shape[1]) < lengths[:, None]] = codes
+    return arr
+
+
+def from_array(arr):
+    '''Unpacks the rows of `arr` into strings, skipping 0s.'''
+    keep = arr != 0
+    text = arr[keep].astype("<u4").tobytes().decode("utf-32-le", "surrogatepass")
+    ends = np.cumsum(keep.sum(axis=1)).tolist()
+    return [text[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+def compact(arr):
+    '''Moves the characters of each row of `arr` to the left, over the 0s.'''
+    keep = arr != 0
+    lengths = keep.sum(axis=1)
+    out = np.zeros((arr.shape[0], int(lengths.max(initial=0)) + 2), np.int32)
+    out[np.arange(out.shape[1]) < lengths[:, None]] = arr[keep]
+    return out
+
+
+def between(codes, first, last):
+    return (codes >= first) & (codes <= last)
+
+
+def compose_array(arr):
+    '''Composes the jamo of `arr` into syllables in place, leaving 0s where leads and tails were, like compose.'''
+    flat = arr.reshape(-1)
+    vowels = np.flatnonzero(between(flat, FIRST_VOWEL, LAST_VOWEL))
+    # every row ends with 0s, so the neighbours of a vowel are in its row, or 0
+    leads = flat[vowels - 1]
+    tails = flat[vowels + 1]
+    led = between(leads, FIRST_LEAD, LAST_LEAD)
+    tailed = between(tails, FIRST_CODA, LAST_CODA)
+
+    # in a run of vowels without a lead, every other one is left bare, starting from the second
+    bare = vowels[~led]
+    starts = np.ones(len(bare), bool)
+    starts[1:] = bare[1:] != bare[:-1] + 1
+    keep = led.copy()
+    keep[~led] = (bare - np.maximum.accumulate(np.where(starts, bare, 0))) % 2 == 0
+    leads = np.where(led, leads, FIRST_LEAD + 11)
+
+    vowels, leads, tails, led, tailed = vowels[keep], leads[keep], tails[keep], led[keep], tailed[keep]
+    flat[vowels] = (0xAC00 + ((leads - FIRST_LEAD) * 21 + flat[vowels] - FIRST_VOWEL) * 28
+                    + np.where(tailed, tails - FIRST_CODA + 1, 0))
+    flat[vowels[led] - 1] = 0
+    flat[vowels[tailed] + 1] = 0
+    return arr
+
+
+class VectorizedRules(object):
+    '''Runs the table, the linking rules, grouping and composing of `g2p` over a batch of utterances at once.
+
+    Every coda is classified by what follows it and rewritten from a lookup built by running the rules
+    themselves on it, so the results are those of G2p.apply_rules. Utterances where a rewrite cannot be
+    looked up, e.g. because two codas meet, go through the scalar functions instead.
+    '''
+    def __init__(self, g2p):
+        self.g2p = g2p
+        self.classes = build_classes()
+        self.table = build_lookup(g2p.compiled_table.rewrite, set(range(OTHER)))
+        self.links = dict()
+        self.grouped = np.array([ord(group(chr(code))) for code in range(FIRST_VOWEL, LAST_VOWEL + 1)], np.int32)
+
+    def link_lookup(self, descriptive):
+        lookup = self.links.get(descriptive)
+        if lookup is None:
+            lookup = build_lookup(lambda s: self.g2p.links(s, descriptive), set(range(BLANK_ONSET)))
+            # only steps of a coda and an onset can be looked up
+            if any(regex is not None or len(trigger) != 2 or not FIRST_CODA <= ord(trigger[0]) <= LAST_CODA
+                   for trigger, regex, _ in self.g2p.links.steps[descriptive]):
+                lookup[2][:] = True
+            self.links[descriptive] = lookup
+        return lookup
+
+    def follow(self, nxt, after):
+        '''Returns the lookup index of what follows each coda: the code point `nxt`, then `after`.'''
+        small = nxt < CLASSIFIED
+        follow = self.classes[np.where(small, nxt, 0)]
+        if not small.all():
+            for code in np.unique(nxt[~small]).tolist():
+                follow[nxt == code] = NON_WORD if NON_WORD_CHAR.match(chr(code)) else OTHER
+        blank = np.flatnonzero(nxt == BLANK)
+        after = after[blank]
+        follow[blank] = np.where(between(after, FIRST_LEAD, LAST_LEAD), BLANK_ONSET + after - FIRST_LEAD,
+                                 np.where(between(after, FIRST_CODA, LAST_CODA), CODA, NON_WORD))
+        return follow
+
+    def rewrite(self, arr, lookup):
+        '''Rewrites the codas of `arr` in place from `lookup`. Returns the rows it could not do.'''
+        out, size, bad = lookup
+        flat = arr.reshape(-1)
+        at = np.flatnonzero(between(flat, FIRST_CODA, LAST_CODA))
+        # every row ends with two 0s, so what follows a coda is in its row
+        keys = (flat[at] - FIRST_CODA) * FOLLOWS + self.follow(flat[at + 1], flat[at + 2])
+        failed = np.unique(at[bad[keys]] // arr.shape[1])
+
+        # the rows that failed are rewritten too, and thrown away later
+        sizes = size[keys]
+        for k in range(3):
+            some = np.flatnonzero(sizes > k)
+            codes = out[keys[some], k]
+            where = at[some] + k
+            flat[where] = np.where(codes == COPY, flat[where], codes)
+        return failed
+
+    def convert(self, inp, descriptive=False, group_vowels=False, to_syl=True):
+        '''The scalar path, for an utterance the hand-written rules have been applied to.'''
+        inp = self.g2p.links(self.g2p.compiled_table(inp), descriptive)
+        if group_vowels:
+            inp = group(inp)
+        if to_syl:
+            inp = compose(inp)
+        return inp
+
+    def arrays(self, strings, descriptive=False, group_vowels=False, to_syl=True):
+        '''Returns (arr, inps, failed): the outputs for preprocessed `strings` as an array of code points
+        with 0s between characters, the strings after the hand-written rules, and the rows to convert
+        from them with self.convert instead.'''
+        g2p = self.g2p
+        inps = []
+        if not any(BATCH_SEP in string for string in strings):
+            inps = g2p.rules(decompose(BATCH_SEP.join(strings)), descriptive).split(BATCH_SEP)
+        if len(inps) != len(strings):
+            inps = [g2p.rules(decompose(string), descriptive) for string in strings]
+
+        arr = to_array(inps)
+        # 0 pads the rows, so it cannot occur in them
+        failed = [np.zeros(0, np.int64)]
+        if "\0" in "".join(inps):
+            failed.append(np.array([i for i, inp in enumerate(inps) if "\0" in inp], np.int64))
+        failed.append(self.rewrite(arr, self.table))
+        arr = compact(arr)
+        failed.append(self.rewrite(arr, self.link_lookup(descriptive)))
+        if group_vowels:
+            vowels = between(arr, FIRST_VOWEL, LAST_VOWEL)
+            arr[vowels] = self.grouped[arr[vowels] - FIRST_VOWEL]
+        if to_syl:
+            compose_array(arr)
+        return arr, inps, np.unique(np.concatenate(failed)).tolist()
+
+    def __call__(self, strings, descriptive=False, group_vowels=False, to_syl=True):
+        '''Converts preprocessed `strings`, like G2p.apply_rules on the decomposition of each.'''
+        arr, inps, failed = self.arrays(strings, descriptive, group_vowels, to_syl)
+        outs = from_array(arr)
+        for i in failed:
+            outs[i] = self.convert(inps[i], descriptive, group_vowels, to_syl)
+        return outs
+
+    def ids(self, strings, descriptive=False, group_vowels=False):
+        '''Converts preprocessed `strings` like self(strings, to_syl=False), straight to phoneme IDs.
+        Returns (ids, lengths) as pad_ids does.'''
+        arr, inps, failed = self.arrays(strings, descriptive, group_vowels, False)
+        arr = compact(arr)
+        ids = np.where(arr < len(CODE2ID), CODE2ID[np.minimum(arr, len(CODE2ID) - 1)], UNK).astype(np.uint16)
+        lengths = (arr != 0).sum(axis=1)
+        if len(failed) > 0:
+            rows = [to_ids(self.convert(inps[i], descriptive, group_vowels, False)) for i in failed]
+            width = max(ids.shape[1], max(map(len, rows)))
+            ids = np.pad(ids, ((0, 0), (0, width - ids.shape[1])), constant_values=PAD)
+            for i, row in zip(failed, rows):
+                ids[i] = PAD
+                ids[i, :len(row)] = row
+                lengths[i] = len(row)
+        return ids[:, :int(lengths.max(initial=0))], lengths
@@ -4,7 +4,6 @@ with open("README.md", mode="r", encoding="utf-8") as fh:
     long_description = fh.read()
 
 REQUIRED_PACKAGES = [
-    'jamo',
     'nltk',
     'konlpy',
     'python-mecab-ko',
@@ -22,9 +21,12 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/Kyubyong/g2pK",
     packages=setuptools.find_packages(),
-    package_data={'g2pk': ['g2pk/idioms.txt', 'g2pk/rules.txt', 'g2pk/table.csv']},
+    package_data={'g2pk': ['g2pk/idioms.txt', 'g2pk/rules.txt', 'g2pk/table.csv', 'g2pk/bench.txt']},
     python_requires=">=3.6",
     include_package_data=True,
+    entry_points={
+        'console_scripts': ['g2pk=g2pk.cli:main'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',
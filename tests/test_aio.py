@@ -0,0 +1,81 @@
+import asyncio
+import threading
+
+import pytest
+
+from g2pk import G2p
+from g2pk.aio import AsyncG2p
+from g2pk.bench import load_corpus
+from g2pk.server import run
+
+SENTS = load_corpus()[:100]
+g2p = G2p()
+
+
+class RecordingG2p(G2p):
+    '''A G2p that records the size of each batch and can be held up until `go` is set.'''
+    def __init__(self):
+        super().__init__()
+        self.sizes = []
+        self.go = threading.Event()
+        self.go.set()
+
+    def batch(self, sentences, *args, **kwargs):
+        self.go.wait()
+        self.sizes.append(len(sentences))
+        return super().batch(sentences, *args, **kwargs)
+
+
+def convert_all(converter, sents, **opts):
+    async def main():
+        async with converter:
+            return await asyncio.gather(*(converter.convert(sent, **opts) for sent in sents))
+    return run(main())
+
+
+def test_one_worker_batches_and_matches_g2p():
+    recording = RecordingG2p()
+    outs = convert_all(AsyncG2p(recording, max_batch=16, max_delay=0.05), SENTS, descriptive=True)
+    assert outs == [g2p(sent, descriptive=True) for sent in SENTS]
+    assert max(recording.sizes) == 16 and sum(recording.sizes) == len(SENTS)
+
+
+def test_worker_processes_match_g2p():
+    outs = convert_all(AsyncG2p(workers=2, max_batch=16), SENTS)
+    assert outs == [g2p(sent) for sent in SENTS]
+
+
+def test_backpressure_and_cancellation():
+    recording = RecordingG2p()
+    recording.go.clear()
+
+    async def main():
+        converter = AsyncG2p(recording, max_batch=2, max_delay=0, max_pending=4)
+        tasks = [asyncio.ensure_future(converter.convert(sent)) for sent in SENTS[:20]]
+        await asyncio.sleep(0.2)
+        # one batch is held up in the worker, and the queue is full
+        assert converter.pending == 4
+        assert sum(task.done() for task in tasks) == 0
+        recording.go.set()
+        await asyncio.gather(*tasks[:2])
+        await converter.close()
+        cancelled = 0
+        for task in tasks[2:]:
+            try:
+                await task
+            except asyncio.CancelledError:
+                cancelled += 1
+        return [task.result() for task in tasks[:2]], cancelled
+
+    outs, cancelled = run(main())
+    assert outs == [g2p(sent) for sent in SENTS[:2]]
+    assert cancelled > 0
+
+
+def test_errors_reach_the_caller():
+    class FailingG2p(G2p):
+        def batch(self, sentences, *args, **kwargs):
+            raise RuntimeError("conversion failed")
+
+    with pytest.raises(RuntimeError):
+        convert_all(AsyncG2p(FailingG2p()), ["가"])
@@ -0,0 +1,16 @@
+import pytest
+
+from g2pk.cli import merge, parse_args, select
+
+
+def test_column_is_1_based():
+    assert parse_args(["-c", "2"]).column == 2
+    for column in ("0", "-1", "x"):
+        with pytest.raises(SystemExit):
+            parse_args(["-c", column])
+
+
+def test_column_select_and_merge():
+    rows = ["id\t밥을", "c3"]
+    assert list(select(rows, 2)) == ["밥을", ""]
+    assert [merge(row, "바블", 2) for row in rows] == ["id\t바블", "c3"]
@@ -0,0 +1,14 @@
+from g2pk import G2p
+from g2pk.bench import CORPUS_PATH
+
+
+def test_workers_match_one_process():
+    g2p = G2p()
+    text = open(CORPUS_PATH, encoding="utf8").read()
+    assert g2p.document(text, workers=2) == g2p.document(text)
+
+
+def test_workers_use_idioms_not_from_a_file():
+    for idioms in ({"사과": "배"}, [("사과", "배")]):
+        g2p = G2p(idioms=idioms)
+        assert g2p.document("사과를 샀다.", workers=2) == g2p.document("사과를 샀다.") == "배를 삳따."
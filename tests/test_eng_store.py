@@ -0,0 +1,54 @@
+import pytest
+
+from g2pk.cmu import CmuDict, write_store
+from g2pk.g2pk import ENG_STORE_VERSION, EngCache, G2p, build_eng_store, shared_cmu
+
+
+def test_store_is_read(tmp_path):
+    path = build_eng_store(str(tmp_path / "eng.tsv"), words=["zzqx"], vocab=False, cmu=shared_cmu())
+    assert EngCache(shared_cmu(), store_path=path).store.get("zzqx") == "지지큐엑스"
+
+
+def test_stale_stores_are_ignored(tmp_path):
+    cmu = shared_cmu()
+    path = build_eng_store(str(tmp_path / "eng.tsv"), words=["hello"], vocab=False, cmu=cmu)
+    assert EngCache(cmu, store_path=path)("hello") == "헐로"
+
+    # without a header, of another version, or tampered with
+    write_store(path, [("hello", "stale")])
+    assert EngCache(cmu, store_path=path)("hello") == "헐로"
+    write_store(path, [("hello", "stale")], ENG_STORE_VERSION - 1, [cmu.path])
+    assert EngCache(cmu, store_path=path)("hello") == "헐로"
+    build_eng_store(path, words=["hello"], vocab=False, cmu=cmu)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data.replace("헐로".encode("utf8"), "헬로".encode("utf8")))
+    assert EngCache(cmu, store_path=path)("hello") == "헐로"
+
+
+def test_store_of_another_dictionary_is_ignored(tmp_path):
+    path = build_eng_store(str(tmp_path / "eng.tsv"), words=["hello"], vocab=False, cmu=shared_cmu())
+    other = tmp_path / "cmudict.tsv"
+    other.write_text("hello\tHH EH1 L OW0\n", encoding="utf8")
+    assert EngCache(CmuDict(str(other)), store_path=path).store.get("hello") is None
+
+
+def test_custom_cmu_skips_default_store():
+    assert G2p().eng_cache.store_path is not None
+    assert G2p(cmu={"hello": [["HH", "AH0", "L", "OW1"]]}).eng_cache.store_path is None
+
+
+def test_save_needs_a_path_without_a_store(tmp_path):
+    g2p = G2p(cmu={"hello": [["HH", "AH0", "L", "OW1"]]})
+    g2p("hello")
+    with pytest.raises(ValueError):
+        g2p.eng_cache.save()
+    path = g2p.eng_cache.save(str(tmp_path / "eng.tsv"))
+    assert EngCache(g2p.cmu, store_path=path).store.get("hello") == g2p.eng_cache("hello")
+
+
+def test_build_from_a_mapping(tmp_path):
+    cmu = {"hello": [["HH", "AH0", "L", "OW1"]], "zebra": [["Z", "IY1", "B", "R", "AH0"]]}
+    path = build_eng_store(str(tmp_path / "eng.tsv"), cmu=cmu)
+    assert dict(EngCache(cmu, store_path=path).store) == {word: EngCache(cmu, store_path=None)(word) for word in cmu}
@@ -0,0 +1,47 @@
+import random
+import re
+
+import pytest
+
+from g2pk.bench import load_corpus
+from g2pk.hangul import compose, decompose
+
+jamo = pytest.importorskip("jamo")
+
+
+def old_compose(letters):
+    '''compose as it was before g2pk.hangul, on top of jamo.j2h.'''
+    letters = re.sub("(^|[^\u1100-\u1112])([\u1161-\u1175])", r"\1ᄋ\2", letters)
+    string = letters
+    syls = set(re.findall("[\u1100-\u1112][\u1161-\u1175][\u11A8-\u11C2]", string))
+    for syl in syls:
+        string = string.replace(syl, jamo.j2h(*syl))
+
+    syls = set(re.findall("[\u1100-\u1112][\u1161-\u1175]", string))
+    for syl in syls:
+        string = string.replace(syl, jamo.j2h(*syl))
+
+    return string
+
+
+def test_decompose_matches_h2j():
+    syllables = "".join(chr(c) for c in range(0xAC00, 0xD7A4))
+    assert decompose(syllables) == jamo.h2j(syllables)
+    for sent in load_corpus():
+        assert decompose(sent) == jamo.h2j(sent)
+
+
+def test_round_trip_matches_old_compose():
+    syllables = "".join(chr(c) for c in range(0xAC00, 0xD7A4))
+    assert compose(decompose(syllables)) == old_compose(jamo.h2j(syllables)) == syllables
+    for sent in load_corpus():
+        assert compose(decompose(sent)) == old_compose(jamo.h2j(sent)), sent
+
+
+def test_random_jamo_matches_old_compose():
+    chars = ([chr(c) for c in range(0x1100, 0x1113)] + [chr(c) for c in range(0x1161, 0x1176)]
+             + [chr(c) for c in range(0x11A8, 0x11C3)] + list(" 가a1/."))
+    rng = random.Random(0)
+    for _ in range(20000):
+        letters = "".join(rng.choice(chars) for _ in range(rng.randint(0, 10)))
+        assert compose(letters) == old_compose(letters), letters
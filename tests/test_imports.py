@@ -0,0 +1,8 @@
+import subprocess
+import sys
+
+
+def test_import_leaves_out_asyncio_and_multiprocessing():
+    code = "import sys, g2pk; print('asyncio' in sys.modules, 'multiprocessing' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, universal_newlines=True, check=True)
+    assert out.stdout.split() == ["False", "False"]
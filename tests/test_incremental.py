@@ -0,0 +1,35 @@
+import random
+
+from g2pk import G2p, IncrementalG2p
+from g2pk.bench import load_corpus
+
+g2p = G2p()
+
+
+def test_edit_changes_analysis_two_eojeols_away():
+    doc = IncrementalG2p("check 어쩔 back 가", g2p)
+    doc.replace(3, 4, "밭이")
+    assert doc.pronunciation == g2p("check 어쩔 back 밭이")
+
+
+def test_random_edits_match_full_conversion():
+    words = [word for sent in load_corpus() for word in sent.split(" ") if word]
+    words += ["check", "back", "어쩔", "밭이", "3개", "12.5", "의", "값을", "넓다", "키읔"]
+    rng = random.Random(0)
+    for trial in range(100):
+        opts = dict(descriptive=trial % 2 == 1, group_vowels=trial % 3 == 1, to_syl=trial % 4 != 1)
+        doc = IncrementalG2p(" ".join(rng.choice(words) for _ in range(rng.randint(1, 8))), g2p, **opts)
+        assert doc.pronunciation == g2p(doc.text, **opts)
+        for _ in range(15):
+            start = rng.randrange(len(doc) + 1)
+            stop = min(len(doc), start + rng.choice([0, 1, 1, 2]))
+            text = " ".join(rng.choice(words) for _ in range(rng.choice([0, 1, 1, 2])))
+            doc.replace(start, stop, text)
+            assert doc.pronunciation == g2p(doc.text, **opts), (start, stop, text)
+
+
+def test_replace_returns_converted_eojeols():
+    doc = IncrementalG2p("밥을 먹었다", g2p)
+    assert doc.replace(0, 1, "국을") == (0, ["구글", "머걷따"])
+    assert doc.replace(0, 2, "") == (0, [])
+    assert doc.pronunciation == ""
@@ -0,0 +1,121 @@
+import random
+import re
+
+from g2pk.g2pk import process_num
+
+
+def old_process_num(num, sino=True):
+    '''process_num as it was before the tables: a ladder over the place of each digit.'''
+    num = re.sub(",", "", num)
+    if num == "0":
+        return "영"
+    if not sino and num == "20":
+        return "스무"
+    digits = "123456789"
+    names = "일이삼사오육칠팔구"
+    digit2name = {d: n for d, n in zip(digits, names)}
+    modifiers = "한 두 세 네 다섯 여섯 일곱 여덟 아홉"
+    decimals = "열 스물 서른 마흔 쉰 예순 일흔 여든 아흔"
+    digit2mod = {d: mod for d, mod in zip(digits, modifiers.split())}
+    digit2dec = {d: dec for d, dec in zip(digits, decimals.split())}
+    spelledout = []
+    for i, digit in enumerate(num):
+        i = len(num) - i - 1
+        name = None
+        if sino:
+            if i == 0:
+                name = digit2name.get(digit, "")
+            elif i == 1:
+                name = digit2name.get(digit, "") + "십"
+                name = name.replace("일십", "십")
+        else:
+            if i == 0:
+                name = digit2mod.get(digit, "")
+            elif i == 1:
+                name = digit2dec.get(digit, "")
+        if digit == '0':
+            if i % 4 == 0:
+                last_three = spelledout[-min(3, len(spelledout)):]
+                if "".join(last_three) == "":
+                    spelledout.append("")
+                    continue
+            else:
+                spelledout.append("")
+                continue
+        if i == 2:
+            name = digit2name.get(digit, "") + "백"
+            name = name.replace("일백", "백")
+        elif i == 3:
+            name = digit2name.get(digit, "") + "천"
+            name = name.replace("일천", "천")
+        elif i == 4:
+            name = digit2name.get(digit, "") + "만"
+            name = name.replace("일만", "만")
+        elif i == 5:
+            name = digit2name.get(digit, "") + "십"
+            name = name.replace("일십", "십")
+        elif i == 6:
+            name = digit2name.get(digit, "") + "백"
+            name = name.replace("일백", "백")
+        elif i == 7:
+            name = digit2name.get(digit, "") + "천"
+            name = name.replace("일천", "천")
+        elif i == 8:
+            name = digit2name.get(digit, "") + "억"
+        elif i == 9:
+            name = digit2name.get(digit, "") + "십"
+        elif i == 10:
+            name = digit2name.get(digit, "") + "백"
+        elif i == 11:
+            name = digit2name.get(digit, "") + "천"
+        elif i == 12:
+            name = digit2name.get(digit, "") + "조"
+        elif i == 13:
+            name = digit2name.get(digit, "") + "십"
+        elif i == 14:
+            name = digit2name.get(digit, "") + "백"
+        elif i == 15:
+            name = digit2name.get(digit, "") + "천"
+        elif i == 16:
+            name = digit2name.get(digit, "") + "경"
+        elif i == 17:
+            name = digit2name.get(digit, "") + "십"
+        elif i == 18:
+            name = digit2name.get(digit, "") + "백"
+        elif i == 19:
+            name = digit2name.get(digit, "") + "천"
+        if name is not None:
+            spelledout.append(name)
+        else:
+            return num
+    return "".join(elem for elem in spelledout)
+
+
+def random_numbers(n, seed=0):
+    rng = random.Random(seed)
+    for _ in range(n):
+        num = str(rng.randrange(10 ** rng.randint(1, 20)))
+        if rng.random() < 0.2:
+            num = "0" * rng.randint(1, 3) + num
+        if rng.random() < 0.2:
+            num = "{:,}".format(int(num))
+        yield num
+
+
+def test_random_numbers_match_old_process_num():
+    for num in random_numbers(50000):
+        for sino in (True, False):
+            assert process_num(num, sino) == old_process_num(num, sino), (num, sino)
+
+
+def test_group_boundaries_match_old_process_num():
+    for places in range(1, 21):
+        for num in ("1" + "0" * (places - 1), "9" * places, "1" * places, "10" * (places // 2), "20", "0"):
+            for sino in (True, False):
+                assert process_num(num, sino) == old_process_num(num, sino), (num, sino)
+
+
+def test_decimals():
+    assert process_num("3.14") == "삼점일사"
+    assert process_num("0.5") == process_num("00.5") == "영점오"
+    assert process_num("1,000.05") == "천점영오"
@@ -0,0 +1,55 @@
+import asyncio
+import io
+import json
+
+from g2pk.server import handle_http, respond, run, serve_stdio
+
+
+class FakeG2p(object):
+    pending = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def convert(self, text, **opts):
+        if text == "fail":
+            raise RuntimeError("conversion failed")
+        return json.dumps([text, opts], ensure_ascii=False, sort_keys=True)
+
+
+def post(body):
+    return run(respond(FakeG2p(), "POST", "/convert", json.dumps(body).encode("utf8")))
+
+
+def test_options_must_be_booleans():
+    assert post({"text": "가", "descriptive": True}) == (200, {"text": '["가", {"descriptive": true}]'})
+    for value in ("no", "false", 0, 1, None):
+        status, response = post({"text": "가", "descriptive": value})
+        assert status == 400 and "descriptive" in response["error"]
+
+
+def test_failed_conversion_is_answered_with_500():
+    async def exchange():
+        server = await asyncio.start_server(lambda r, w: handle_http(FakeG2p(), r, w), "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        body = json.dumps({"text": "fail"}).encode("utf8")
+        writer.write(b"POST /convert HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+        response = await reader.read()
+        writer.close()
+        server.close()
+        return response
+
+    response = run(exchange())
+    assert response.startswith(b"HTTP/1.1 500 Internal Server Error\r\n")
+    assert b"conversion failed" in response
+
+
+def test_stdio_answers_every_line(monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO("가\nfail\n나\n" * 5))
+    run(serve_stdio(FakeG2p(), window=2))
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 15
+    assert lines[:3] == ['["가", {}]', "error: RuntimeError('conversion failed')", '["나", {}]']
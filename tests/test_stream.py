@@ -0,0 +1,32 @@
+import random
+
+from g2pk import G2p, StreamingG2p
+from g2pk.bench import load_corpus
+
+g2p = G2p()
+
+
+def stream(text, rng, **opts):
+    streaming = StreamingG2p(g2p, **opts)
+    out = []
+    start = 0
+    while start < len(text):
+        stop = start + rng.randint(1, 4)
+        out.append(streaming.feed(text[start:stop]))
+        start = stop
+    out.append(streaming.flush())
+    return "".join(out)
+
+
+def test_example_cut_anywhere():
+    text = "신을 신고 얼른 동사무소에 가서 혼인 신고 해라"
+    rng = random.Random(0)
+    for _ in range(100):
+        assert stream(text, rng) == g2p(text)
+
+
+def test_sentences_in_random_fragments():
+    rng = random.Random(0)
+    for sent in load_corpus():
+        for opts in (dict(), dict(descriptive=True, to_syl=False)):
+            assert stream(sent, rng, **opts) == g2p(sent, **opts), sent
@@ -0,0 +1,45 @@
+import random
+import re
+
+from g2pk import G2p
+from g2pk.bench import load_corpus
+from g2pk.g2pk import CompiledTable, parse_table, shared_table
+from g2pk.hangul import decompose
+
+TABLE = parse_table()
+PATTERNS = [(re.compile(str1), str2) for str1, str2, _ in TABLE]
+
+
+def apply_table(inp):
+    '''The table as G2p applied it before CompiledTable: each rule in turn over the whole string.'''
+    for pattern, str2 in PATTERNS:
+        inp = pattern.sub(str2, inp)
+    return inp
+
+
+def table_inputs():
+    g2p = G2p()
+    for sent in load_corpus():
+        jamo = decompose(g2p.preprocess(sent))
+        for descriptive in (False, True):
+            yield g2p.rules(jamo, descriptive)
+
+
+def random_inputs(n, seed=0):
+    chars = ([" "] * 8 + [chr(c) for c in range(0x1100, 0x1113)] + [chr(c) for c in range(0x11A8, 0x11C3)]
+             + list("ᅡᅵ,.\n가a1"))
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield "".join(rng.choice(chars) for _ in range(rng.randint(0, 12)))
+
+
+def test_corpus_matches_sequential_table():
+    compiled, shared = CompiledTable(TABLE), shared_table()[1]
+    for inp in table_inputs():
+        assert compiled(inp) == shared(inp) == apply_table(inp), inp
+
+
+def test_random_jamo_matches_sequential_table():
+    compiled, shared = CompiledTable(TABLE), shared_table()[1]
+    for inp in random_inputs(3000):
+        assert compiled(inp) == shared(inp) == apply_table(inp), inp
@@ -0,0 +1,54 @@
+import itertools
+import random
+
+import pytest
+
+from g2pk import G2p
+from g2pk.bench import load_corpus
+from g2pk.hangul import decompose
+
+np = pytest.importorskip("numpy")
+
+from g2pk.vectorized import VectorizedRules  # noqa: E402
+
+g2p = G2p()
+OPTIONS = [dict(descriptive=d, group_vowels=g, to_syl=t) for d, g, t in itertools.product((False, True), repeat=3)]
+
+
+def random_strings(n, seed=0):
+    '''Preprocessed strings: syllables, tags, blanks, punctuation and stray jamo.'''
+    rng = random.Random(seed)
+    syllables = [chr(c) for c in range(0xAC00, 0xD7A4)]
+    common = list("의가나다를은는이있닭값밟넓앉젊밥국맛옷꽃밭부엌")
+    others = ["/P", "/J", "/E", "/B", " ", " ", " ", ",", ".", "?", "\n", "a", "1", "ᆨ", "ᄋ", "ᅡ", "\0", "é"]
+    for _ in range(n):
+        yield "".join(rng.choice(syllables) if rng.random() < 0.3 else rng.choice(common + others)
+                      for _ in range(rng.randint(0, 16)))
+
+
+def test_batch_matches_scalar_on_corpus():
+    sents = load_corpus()
+    for opts in OPTIONS:
+        assert g2p.batch(sents, backend="numpy", batch_size=512, **opts) == [g2p(sent, **opts) for sent in sents]
+
+
+def test_random_strings_match_apply_rules():
+    vectorized = VectorizedRules(g2p)
+    strings = list(random_strings(4000))
+    for opts in OPTIONS:
+        for i in range(0, len(strings), 500):
+            chunk = strings[i:i + 500]
+            assert vectorized(chunk, **opts) == [g2p.apply_rules(decompose(string), **opts) for string in chunk]
+
+
+def test_batch_ids_matches_python_backend():
+    sents = load_corpus()
+    for descriptive, group_vowels in itertools.product((False, True), repeat=2):
+        ids, lengths = g2p.batch_ids(sents, descriptive, group_vowels, backend="numpy")
+        expected_ids, expected_lengths = g2p.batch_ids(sents, descriptive, group_vowels)
+        assert np.array_equal(ids, expected_ids) and np.array_equal(lengths, expected_lengths)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        g2p.batch(["가"], backend="cuda")